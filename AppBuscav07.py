@@ -16,6 +16,14 @@ import fitz  # PyMuPDF
 from PIL import Image, ImageTk
 import io
 from tkinter import filedialog, END, NW
+from scheduler import PageScheduler
+from word_boxes import load_page_words, find_word_boxes
+from searchable_pdf import preferred_pdf_path, is_sidecar
+from entity_index import EntityIndex, ENTITY_INDEX_NAME
+from corpus_store import CorpusStore, corpus_path
+from jsonl_pages import JsonlPageReader
+from page_journal import JOURNAL_SUFFIX
+from compressed_io import open_text, strip_compression_suffix
 
 class PDFProcessorGUI:
     def __init__(self, root):
@@ -34,6 +42,14 @@ class PDFProcessorGUI:
         self.total_pages = 0
         self.zoom_factor = 1.0
         
+        # Importação: arquivos pedidos pelo usuário vão para o início da fila
+        self.requested_files = set()
+        self.scheduler = None
+        
+        # Índice de entidades carregado uma vez para as buscas por número de processo
+        self.entity_index = None
+        self.entity_index_key = None
+        
         # Create notebook for tabs
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill=BOTH, expand=True, padx=10, pady=5)
@@ -70,10 +86,17 @@ class PDFProcessorGUI:
                                        command=self.start_processing, style='primary.TButton')
         self.process_button.pack(pady=20)
         
+        ttk.Button(self.import_frame, text="Priorizar Arquivos...",
+                   command=self.prioritize_files).pack(pady=5)
+        
         # Progress bar
         self.progress = ttk.Progressbar(self.import_frame, mode='indeterminate')
         self.progress.pack(fill=X, padx=5, pady=5)
         
+        # Queue depth and ETA
+        self.queue_label = ttk.Label(self.import_frame, text="Fila: vazia")
+        self.queue_label.pack(anchor=W, padx=5)
+        
         # Log area
         log_frame = ttk.LabelFrame(self.import_frame, text="Log", padding=10)
         log_frame.pack(fill=BOTH, expand=True, padx=5, pady=5)
@@ -97,7 +120,7 @@ class PDFProcessorGUI:
         
         # File type dropdown
         ttk.Label(files_frame, text="Tipo de Arquivo:").pack(anchor=W, padx=5, pady=2)
-        self.search_file_type = ttk.Combobox(files_frame, values=["JSON", "TXT"], state="readonly")
+        self.search_file_type = ttk.Combobox(files_frame, values=["JSON", "JSONL", "TXT", "BANCO"], state="readonly")
         self.search_file_type.pack(fill=X, padx=5, pady=5)
         self.search_file_type.set("JSON")
         self.search_file_type.bind('<<ComboboxSelected>>', self.update_search_file_list)
@@ -121,6 +144,12 @@ class PDFProcessorGUI:
         search_input_frame = ttk.Frame(search_frame)
         search_input_frame.pack(fill=X)
         
+        # Modo de busca: texto livre no arquivo selecionado ou número de processo em todos
+        self.search_mode = ttk.Combobox(search_input_frame, values=["Texto", "Nº do processo"],
+                                        state="readonly", width=15)
+        self.search_mode.pack(side=LEFT, padx=5)
+        self.search_mode.set("Texto")
+        
         ttk.Label(search_input_frame, text="Termo:").pack(side=LEFT, padx=5)
         self.search_entry = ttk.Entry(search_input_frame)
         self.search_entry.pack(side=LEFT, fill=X, expand=True, padx=5)
@@ -182,7 +211,7 @@ class PDFProcessorGUI:
         
         # File type dropdown
         ttk.Label(files_frame, text="Tipo de Arquivo:").pack(anchor=W, padx=5, pady=2)
-        self.view_file_type = ttk.Combobox(files_frame, values=["JSON", "TXT"], state="readonly")
+        self.view_file_type = ttk.Combobox(files_frame, values=["JSON", "JSONL", "TXT", "BANCO"], state="readonly")
         self.view_file_type.pack(fill=X, padx=5, pady=5)
         self.view_file_type.set("JSON")
         self.view_file_type.bind('<<ComboboxSelected>>', self.update_view_file_list)
@@ -212,14 +241,30 @@ class PDFProcessorGUI:
         self.content_text.pack(fill=BOTH, expand=True)
         scrollbar.config(command=self.content_text.yview)
 
+    def list_stored_documents(self):
+        # Documentos do banco do acervo (nomes dos PDFs)
+        db_path = corpus_path(self.dir_entry.get())
+        if not os.path.exists(db_path):
+            return []
+        store = CorpusStore(db_path)
+        try:
+            return store.filenames()
+        finally:
+            store.close()
+
     def update_search_file_list(self, event=None):
         self.search_files_list.delete(*self.search_files_list.get_children())
         file_type = self.search_file_type.get().lower()
         
         directory = self.dir_entry.get()
         try:
+            if file_type == 'banco':
+                for file in self.list_stored_documents():
+                    self.search_files_list.insert('', 'end', text=file)
+                return
             for file in os.listdir(directory):
-                if file.endswith(f'.{file_type}'):
+                # Diários de páginas (.pages.jsonl) não são documentos prontos
+                if strip_compression_suffix(file).endswith(f'.{file_type}') and not file.endswith(JOURNAL_SUFFIX):
                     self.search_files_list.insert('', 'end', text=file)
         except Exception as e:
             self.log_message(f"Erro ao listar arquivos: {str(e)}")
@@ -230,8 +275,13 @@ class PDFProcessorGUI:
         
         directory = self.dir_entry.get()
         try:
+            if file_type == 'banco':
+                for file in self.list_stored_documents():
+                    self.view_files_list.insert('', 'end', text=file)
+                return
             for file in os.listdir(directory):
-                if file.endswith(f'.{file_type}'):
+                # Diários de páginas (.pages.jsonl) não são documentos prontos
+                if strip_compression_suffix(file).endswith(f'.{file_type}') and not file.endswith(JOURNAL_SUFFIX):
                     self.view_files_list.insert('', 'end', text=file)
         except Exception as e:
             self.log_message(f"Erro ao listar arquivos: {str(e)}")
@@ -247,20 +297,41 @@ class PDFProcessorGUI:
         filepath = os.path.join(self.dir_entry.get(), filename)
         
         try:
-            if filename.endswith('.json'):
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.content_text.insert(END, f"Arquivo: {data['document_info']['filename']}\n")
-                    self.content_text.insert(END, f"Data de Extração: {data['document_info']['extraction_date']}\n")
-                    self.content_text.insert(END, f"Total de Páginas: {data['document_info']['total_pages']}\n\n")
+            # Arquivos .gz/.zst são descompactados na leitura
+            name = strip_compression_suffix(filename)
+            if name.endswith('.jsonl'):
+                # Lê página por página pelo índice de posições, sem carregar o arquivo inteiro
+                with JsonlPageReader(filepath) as reader:
+                    info = reader.document_info()
+                    self.content_text.insert(END, f"Arquivo: {info['filename']}\n")
+                    self.content_text.insert(END, f"Data de Extração: {info['extraction_date']}\n")
+                    self.content_text.insert(END, f"Total de Páginas: {info['total_pages']}\n\n")
                     
-                    for page in data['pages']:
+                    for page in reader.pages():
                         self.content_text.insert(END, f"Página {page['page_number']}\n")
                         self.content_text.insert(END, f"Palavras: {page['word_count']}\n")
                         self.content_text.insert(END, f"Conteúdo:\n{page['content']}\n")
                         self.content_text.insert(END, "-" * 50 + "\n\n")
+            elif name.endswith('.json') or filename.lower().endswith('.pdf'):
+                if filename.lower().endswith('.pdf'):
+                    # Documento do banco do acervo
+                    store = CorpusStore(corpus_path(self.dir_entry.get()))
+                    data = store.load_document(filename)
+                    store.close()
+                else:
+                    with open_text(filepath) as f:
+                        data = json.load(f)
+                self.content_text.insert(END, f"Arquivo: {data['document_info']['filename']}\n")
+                self.content_text.insert(END, f"Data de Extração: {data['document_info']['extraction_date']}\n")
+                self.content_text.insert(END, f"Total de Páginas: {data['document_info']['total_pages']}\n\n")
+                
+                for page in data['pages']:
+                    self.content_text.insert(END, f"Página {page['page_number']}\n")
+                    self.content_text.insert(END, f"Palavras: {page['word_count']}\n")
+                    self.content_text.insert(END, f"Conteúdo:\n{page['content']}\n")
+                    self.content_text.insert(END, "-" * 50 + "\n\n")
             else:
-                with open(filepath, 'r', encoding='utf-8') as f:
+                with open_text(filepath) as f:
                     content = f.read()
                     self.content_text.insert(END, content)
         except Exception as e:
@@ -281,10 +352,37 @@ class PDFProcessorGUI:
         self.log_text.insert(END, f"{datetime.now().strftime('%H:%M:%S')} - {message}\n")
         self.log_text.see(END)
 
+    def prioritize_files(self):
+        files = filedialog.askopenfilenames(
+            initialdir=self.dir_entry.get(),
+            title="Selecione os PDFs prioritários",
+            filetypes=[("PDF", "*.pdf")]
+        )
+        for pdf_path in files:
+            pdf_path = os.path.join(self.dir_entry.get(), os.path.basename(pdf_path))
+            self.requested_files.add(pdf_path)
+            if self.scheduler is not None:
+                self.scheduler.prioritize(pdf_path)
+            self.log_message(f"Prioridade: {os.path.basename(pdf_path)}")
+
+    def update_queue_status(self):
+        if self.scheduler is None:
+            self.queue_label.configure(text="Fila: vazia")
+            return
+        progress = self.scheduler.progress()
+        eta = progress["eta_seconds"]
+        eta_text = f"{int(eta // 60)}min {int(eta % 60):02d}s" if eta is not None else "calculando..."
+        self.queue_label.configure(
+            text=f"Fila: {progress['documents']} arquivo(s), {progress['pages_queued']} página(s) | "
+                 f"{progress['pages_per_second']:.2f} páginas/s | Tempo restante: {eta_text}")
+        self.root.after(1000, self.update_queue_status)
+
     def start_processing(self):
         self.process_button.configure(state='disabled')
         self.progress.start()
         self.log_message("Iniciando processamento...")
+        self.scheduler = PageScheduler()
+        self.update_queue_status()
         
         thread = threading.Thread(target=self.process_pdfs)
         thread.daemon = True
@@ -292,4 +390,233 @@ class PDFProcessorGUI:
 
     def process_pdfs(self):
         try:
-            from pesquisav06 import load_portuguese_dictionary, clean_text, extract_text_from_pdf, save_to_json, save_to_txt
\ No newline at end of file
+            from pesquisav06 import ingest_documents, save_document, stream_jsonl_page, SKIPPED_REPORT_LIMIT
+            from pesquisav06 import ingestion_settings, OCR_WORKERS, load_correction_memo, save_correction_memo, ocr_counters
+            from ingest_manifest import IngestionManifest
+            from page_journal import journal_path_for
+            
+            pdf_directory = self.dir_entry.get()
+            manifest = IngestionManifest(pdf_directory)
+            entity_index = EntityIndex(pdf_directory)
+            store = CorpusStore(corpus_path(pdf_directory))
+            settings = ingestion_settings()
+            skipped = []
+            pending = []
+            
+            for pdf_file in os.listdir(pdf_directory):
+                if pdf_file.lower().endswith('.pdf') and not is_sidecar(pdf_file):
+                    pdf_path = os.path.join(pdf_directory, pdf_file)
+                    
+                    # Pula arquivos que não mudaram desde o último processamento
+                    needed, reason = manifest.needs_processing(pdf_path, settings)
+                    if not needed:
+                        skipped.append(pdf_file)
+                        continue
+                    
+                    self.log_message(f"Na fila: {pdf_file} ({reason})")
+                    pending.append(pdf_path)
+            
+            # O JSONL é gravado página a página, à medida que cada uma fica pronta
+            jsonl_writers = {}
+            
+            def stream_page(pdf_path, page_data):
+                stream_jsonl_page(jsonl_writers, pdf_path, page_data)
+            
+            def on_document(pdf_path, pdf_data, error):
+                pdf_file = os.path.basename(pdf_path)
+                try:
+                    # Grava no banco do acervo; JSON, TXT, JSONL e PDF pesquisável são exportações
+                    outputs = save_document(pdf_path, pdf_data, error, store, manifest, entity_index, settings,
+                                            jsonl_writers.pop(pdf_path, None))
+                except Exception as e:
+                    self.log_message(f"Erro ao processar {pdf_file}: {str(e)}")
+                    return
+                if pdf_data["document_info"].get("resumed_pages"):
+                    self.log_message(f"Retomado {pdf_file}: {pdf_data['document_info']['resumed_pages']} página(s) já processadas")
+                for output in outputs:
+                    self.log_message(f"Criado: {output}")
+            
+            # Todos os PDFs dividem a mesma fila de páginas; os priorizados vão na frente
+            # e um arquivo grande não segura os pequenos. Retoma do diário de páginas
+            # se um processamento anterior foi interrompido.
+            journals = {pdf_path: journal_path_for(os.path.splitext(pdf_path)[0]) for pdf_path in pending}
+            ingest_documents(pending, urgent=self.requested_files, workers=OCR_WORKERS, journals=journals,
+                             scheduler=self.scheduler, on_document=on_document, on_page=stream_page)
+            self.requested_files = set()
+            store.close()
+            
+            manifest.save()
+            save_correction_memo()
+            stats = load_correction_memo().stats()
+            self.log_message(f"Cache de correções: {stats['hits']} acertos, {stats['misses']} falhas "
+                             f"({stats['hit_rate']:.0%})")
+            if ocr_counters["blank_pages"]:
+                self.log_message(f"Páginas em branco ignoradas: {ocr_counters['blank_pages']} "
+                                 f"(~{ocr_counters['ocr_seconds_saved']:.0f}s de OCR economizados)")
+            self.log_message(f"Arquivos sem alteração ignorados: {len(skipped)}")
+            for pdf_file in skipped[:SKIPPED_REPORT_LIMIT]:
+                self.log_message(f"  {pdf_file}")
+            if len(skipped) > SKIPPED_REPORT_LIMIT:
+                self.log_message(f"  ... e mais {len(skipped) - SKIPPED_REPORT_LIMIT}")
+            self.log_message("Processamento concluído!")
+            self.update_search_file_list()
+            self.update_view_file_list()
+        except Exception as e:
+            self.log_message(f"Erro: {str(e)}")
+        finally:
+            self.root.after(0, self.finish_processing)
+
+    def finish_processing(self):
+        self.scheduler = None
+        self.process_button.configure(state='normal')
+        self.progress.stop()
+
+    def search_documents(self):
+        if self.search_mode.get() == "Nº do processo":
+            self.search_process_number()
+            return
+        
+        # Obtém o termo de busca e verifica se não está vazio
+        search_term = self.search_entry.get().strip().lower()
+        if not search_term:
+            return
+    
+        # Verifica se há um arquivo selecionado na lista
+        selected = self.search_files_list.selection()
+        if not selected:
+            return
+    
+        # Obtém o nome do arquivo selecionado
+        filename = self.search_files_list.item(selected[0])['text']
+        
+        # Converte o nome do arquivo (JSON ou TXT) para o PDF correspondente
+        file_type = self.search_file_type.get().lower()
+        pdf_filename = strip_compression_suffix(filename).replace(f'.{file_type}', '.pdf')
+        pdf_path = os.path.join(self.dir_entry.get(), pdf_filename)
+    
+        try:
+            # Fecha o PDF atual se estiver aberto
+            if self.current_pdf:
+                self.current_pdf.close()
+                
+            # Abre o novo PDF (a cópia pesquisável, se existir)
+            self.current_pdf = fitz.open(preferred_pdf_path(pdf_path))
+            self.total_pages = len(self.current_pdf)
+            self.current_page = 0
+            
+            # Destaca o termo a partir das caixas de palavras gravadas na importação;
+            # só JSONs antigos, sem caixas, caem na busca página a página do PDF
+            page_words = load_page_words(pdf_path)
+            matched_pages = []
+            for page_num in range(self.total_pages):
+                page = self.current_pdf[page_num]
+                if page_words:
+                    boxes = find_word_boxes(page_words.get(page_num + 1), search_term)
+                    text_instances = [fitz.Rect(box) for box in boxes]
+                else:
+                    text_instances = page.search_for(search_term)
+                if text_instances:
+                    matched_pages.append(page_num)
+                
+                # Destaca cada ocorrência
+                for inst in text_instances:
+                    highlight = page.add_highlight_annot(inst)
+                    highlight.set_colors(stroke=(1, 0, 0))  # Cor vermelha
+                    highlight.update()
+            
+            # Vai para a primeira página com ocorrências
+            if matched_pages:
+                self.current_page = matched_pages[0]
+            
+            # Exibe a primeira página com os destaques
+            self.display_current_page()
+            self.log_message(f"Busca concluída: {len(matched_pages)} de {len(self.current_pdf)} páginas com ocorrências")
+            
+        except Exception as e:
+            self.log_message(f"Erro ao processar PDF: {str(e)}")
+
+    def search_process_number(self):
+        number = self.search_entry.get().strip()
+        if not number:
+            return
+        
+        # Consulta direta no índice de entidades, sem abrir os JSONs
+        hits = self.load_entity_index().lookup('process', number)
+        if not hits:
+            self.log_message(f"Processo não encontrado: {number}")
+            return
+        for filename, page_number in hits:
+            self.log_message(f"Processo {number}: {filename}, página {page_number}")
+        
+        # Abre o primeiro documento na página da primeira ocorrência
+        filename, page_number = hits[0]
+        pdf_path = os.path.join(self.dir_entry.get(), filename)
+        try:
+            if self.current_pdf:
+                self.current_pdf.close()
+            self.current_pdf = fitz.open(preferred_pdf_path(pdf_path))
+            self.total_pages = len(self.current_pdf)
+            self.current_page = page_number - 1
+            
+            page = self.current_pdf[self.current_page]
+            boxes = find_word_boxes(load_page_words(pdf_path).get(page_number), number)
+            for inst in [fitz.Rect(box) for box in boxes] or page.search_for(number):
+                highlight = page.add_highlight_annot(inst)
+                highlight.set_colors(stroke=(1, 0, 0))  # Cor vermelha
+                highlight.update()
+            
+            self.display_current_page()
+        except Exception as e:
+            self.log_message(f"Erro ao processar PDF: {str(e)}")
+
+    def load_entity_index(self):
+        # O índice fica em memória; só é relido quando o diretório muda ou o
+        # arquivo é regravado por uma importação
+        directory = self.dir_entry.get()
+        path = os.path.join(directory, ENTITY_INDEX_NAME)
+        key = (directory, os.path.getmtime(path) if os.path.exists(path) else None)
+        if self.entity_index is None or self.entity_index_key != key:
+            self.entity_index = EntityIndex(directory)
+            self.entity_index_key = key
+        return self.entity_index
+
+    def display_current_page(self):
+        if not self.current_pdf:
+            return
+            
+        page = self.current_pdf[self.current_page]
+        pix = page.get_pixmap(matrix=fitz.Matrix(self.zoom_factor, self.zoom_factor))
+        
+        img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        photo = ImageTk.PhotoImage(img)
+        
+        # Atualiza o canvas e a área de rolagem
+        self.pdf_canvas.delete("all")
+        self.pdf_canvas.create_image(0, 0, anchor=NW, image=photo)
+        self.pdf_canvas.config(scrollregion=(0, 0, pix.width, pix.height))
+        setattr(self.pdf_canvas, '_image_reference', photo)  # Keep reference to prevent garbage collection
+        
+        self.page_label.config(text=f"Página: {self.current_page + 1}/{self.total_pages}")
+
+    def next_page(self):
+        if self.current_pdf and self.current_page < self.total_pages - 1:
+            self.current_page += 1
+            self.display_current_page()
+
+    def prev_page(self):
+        if self.current_pdf and self.current_page > 0:
+            self.current_page -= 1
+            self.display_current_page()
+
+    def zoom_in(self):
+        self.zoom_factor *= 1.2
+        self.display_current_page()
+
+    def zoom_out(self):
+        self.zoom_factor *= 0.8
+        self.display_current_page()
+
+if __name__ == "__main__":
+    root = ttk.Window(themename="darkly")
+    app = PDFProcessorGUI(root)
+    root.mainloop()
@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import fitz  # PyMuPDF
+from pesquisav06 import (render_pages, prepare_page_image, save_to_json, save_to_txt, load_lexicon, correct_word,
+                         ocr_page_data, OCR_DPI, OCR_LANG, OCR_BACKEND, RENDER_WINDOW)
+from ocr_backends import get_ocr_backend
+from compressed_io import open_text, find_output, available_compression
+
+# Benchmarks of the ingestion building blocks on the sample PDFs
+# Usage: python benchmark.py [pdf directory]
+
+OCR_BENCH_PAGES = 10
+
+# Image preparation step sets compared by OCR confidence; a step belongs in
+# PREPARE_STEPS only when it pays for its time
+PREPARE_CANDIDATES = [(), ('threshold',), ('threshold', 'deskew'), ('threshold', 'deskew', 'despeckle')]
+
+# Expected corrections of OCR tokens: glued words have to be split, and long
+# words with a typo corrected rather than cut into dictionary fragments
+CORRECTION_CHECKS = [
+    ('estadoriodejaneiro', ['estado', 'rio', 'janeiro']),
+    ('administraçao', ['administração']),
+    ('sociotnstitucional', ['socioinstitucional']),
+    ('escceroiridotomia', ['escleroiridotomia']),
+]
+
+def bench_render(pdf_path, backend, dpi=OCR_DPI, window=RENDER_WINDOW):
+    with fitz.open(pdf_path) as doc:
+        total_pages = len(doc)
+
+    started = time.perf_counter()
+    for first_page in range(1, total_pages + 1, window):
+        page_numbers = list(range(first_page, min(first_page + window, total_pages + 1)))
+        for _, image in render_pages(pdf_path, page_numbers, dpi=dpi, backend=backend):
+            image.load()
+    return total_pages, time.perf_counter() - started
+
+def bench_ocr(images, backend):
+    # The first page also pays for starting the engine; it is timed separately
+    engine = get_ocr_backend(backend, OCR_LANG)
+    started = time.perf_counter()
+    engine.image_to_string(images[0])
+    first_page = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for image in images[1:]:
+        engine.image_to_string(image)
+    return first_page, time.perf_counter() - started
+
+def bench_prepare(images, steps, backend=OCR_BACKEND):
+    # Returns (mean word confidence, preparation seconds, OCR seconds) of the pages prepared with `steps`
+    started = time.perf_counter()
+    prepared = [prepare_page_image(image, steps) for image in images]
+    prepare_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    confidences = [ocr_page_data(image, backend=backend)[1] for image in prepared]
+    return sum(confidences) / len(confidences), prepare_seconds, time.perf_counter() - started
+
+def bench_compression(data, compression, directory):
+    # Returns (bytes on disk, write seconds, read seconds) of the JSON and TXT outputs
+    base_name = os.path.join(directory, "bench")
+    started = time.perf_counter()
+    paths = [save_to_json(data, base_name, compression), save_to_txt(data, base_name, compression)]
+    written = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with open_text(paths[0]) as f:
+        json.load(f)
+    with open_text(paths[1]) as f:
+        f.read()
+    read = time.perf_counter() - started
+    return sum(os.path.getsize(path) for path in paths), written, read
+
+def check_corrections():
+    # Returns the (token, expected, got) of every failing CORRECTION_CHECKS entry
+    dictionary, fuzzy_index, segmenter = load_lexicon()
+    failures = []
+    for token, expected in CORRECTION_CHECKS:
+        got = correct_word(token, dictionary, fuzzy_index, segmenter)
+        if got != expected:
+            failures.append((token, expected, got))
+    return failures
+
+if __name__ == "__main__":
+    pdf_directory = sys.argv[1] if len(sys.argv) > 1 else "c:\\Dev\\Whoosh\\pdf"
+    pdf_files = sorted(f for f in os.listdir(pdf_directory) if f.lower().endswith('.pdf'))
+
+    failures = check_corrections()
+    print(f"Word corrections: {len(CORRECTION_CHECKS) - len(failures)}/{len(CORRECTION_CHECKS)} as expected")
+    for token, expected, got in failures:
+        print(f"  {token}: expected {expected}, got {got}")
+    print()
+
+    print(f"Rendering at {OCR_DPI} dpi")
+    print(f"{'File':40} {'Backend':10} {'Pages':>6} {'Seconds':>9} {'Pages/s':>8}")
+    for pdf_file in pdf_files:
+        pdf_path = os.path.join(pdf_directory, pdf_file)
+        for backend in ('poppler', 'pymupdf'):
+            pages, seconds = bench_render(pdf_path, backend)
+            print(f"{pdf_file[:40]:40} {backend:10} {pages:6} {seconds:9.2f} {pages / seconds:8.2f}")
+
+    print()
+    print(f"OCR throughput (first {OCR_BENCH_PAGES} pages of each PDF)")
+    print(f"{'File':40} {'Backend':12} {'Pages':>6} {'1st page s':>10} {'Pages/s':>8}")
+    for pdf_file in pdf_files:
+        pdf_path = os.path.join(pdf_directory, pdf_file)
+        with fitz.open(pdf_path) as doc:
+            page_numbers = list(range(1, min(len(doc), OCR_BENCH_PAGES) + 1))
+        images = [prepare_page_image(image) for _, image in render_pages(pdf_path, page_numbers, backend='pymupdf')]
+        for backend in ('pytesseract', 'tesserocr'):
+            # Without tesserocr installed get_ocr_backend falls back to pytesseract,
+            # whose numbers are already in the table
+            if get_ocr_backend(backend, OCR_LANG).name != backend:
+                continue
+            first_page, seconds = bench_ocr(images, backend)
+            rate = (len(images) - 1) / seconds if seconds else 0.0
+            print(f"{pdf_file[:40]:40} {backend:12} {len(images):6} {first_page:10.2f} {rate:8.2f}")
+
+    print()
+    print(f"Image preparation (first {OCR_BENCH_PAGES} pages of each PDF)")
+    print(f"{'File':40} {'Steps':30} {'Conf':>6} {'Prep ms/p':>9} {'OCR ms/p':>9}")
+    for pdf_file in pdf_files:
+        pdf_path = os.path.join(pdf_directory, pdf_file)
+        with fitz.open(pdf_path) as doc:
+            page_numbers = list(range(1, min(len(doc), OCR_BENCH_PAGES) + 1))
+        images = [image for _, image in render_pages(pdf_path, page_numbers, backend='pymupdf')]
+        for steps in PREPARE_CANDIDATES:
+            confidence, prepare_seconds, ocr_seconds = bench_prepare(images, steps)
+            print(f"{pdf_file[:40]:40} {'+'.join(steps) or 'none':30} {confidence:6.1f} "
+                  f"{prepare_seconds * 1000 / len(images):9.1f} {ocr_seconds * 1000 / len(images):9.1f}")
+
+    print()
+    print("JSON + TXT outputs by compression")
+    print(f"{'File':40} {'Codec':6} {'KB':>9} {'Ratio':>6} {'Write MB/s':>10} {'Read ms':>8}")
+    for pdf_file in pdf_files:
+        json_path = find_output(os.path.join(pdf_directory, os.path.splitext(pdf_file)[0] + '.json'))
+        if json_path is None:
+            continue
+        with open_text(json_path) as f:
+            data = json.load(f)
+        with tempfile.TemporaryDirectory() as directory:
+            plain_size = None
+            # zstd is only measured when the zstandard package is installed
+            for compression in dict.fromkeys([None, 'gzip', available_compression('zstd')]):
+                size, written, read = bench_compression(data, compression, directory)
+                plain_size = plain_size or size
+                print(f"{pdf_file[:40]:40} {compression or 'none':6} {size / 1024:9.1f} {plain_size / size:6.2f} "
+                      f"{plain_size / written / 1e6:10.2f} {read * 1000:8.1f}")
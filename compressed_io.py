@@ -0,0 +1,73 @@
+import io
+import os
+import gzip
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compressed JSON/TXT outputs. Writers add the codec suffix to the file name
+# (.json.gz, .txt.zst); readers open any variant and decompress transparently,
+# so plain and compressed files can live side by side in the same directory.
+
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+
+_warned = set()
+
+def available_compression(compression):
+    # zstd needs the zstandard package; without it gzip (stdlib) is used
+    if compression == 'zstd' and zstandard is None:
+        if compression not in _warned:
+            _warned.add(compression)
+            print("zstandard is not installed, falling back to gzip")
+        return 'gzip'
+    return compression
+
+def output_path(path, compression=None):
+    compression = available_compression(compression)
+    return path + COMPRESSION_SUFFIXES[compression] if compression else path
+
+def open_output(path, compression=None):
+    # Text stream writing `path` with the codec suffix added; returns (stream, actual path)
+    compression = available_compression(compression)
+    # Variants left by a run with another setting would shadow the new file
+    for stale in [path] + [path + suffix for suffix in COMPRESSION_SUFFIXES.values()]:
+        if stale != output_path(path, compression) and os.path.exists(stale):
+            os.remove(stale)
+    path = output_path(path, compression)
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', encoding='utf-8', compresslevel=GZIP_LEVEL), path
+    if compression == 'zstd':
+        raw = open(path, 'wb')
+        writer = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(writer, encoding='utf-8'), path
+    return open(path, 'w', encoding='utf-8'), path
+
+def strip_compression_suffix(path):
+    for suffix in COMPRESSION_SUFFIXES.values():
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+def find_output(path):
+    # The existing variant of an output: plain first, then the compressed ones
+    for candidate in [path] + [path + suffix for suffix in COMPRESSION_SUFFIXES.values()]:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+def open_text(path):
+    # Reads plain, gzip or zstd files, told apart by their first bytes
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+    if magic[:2] == b'\x1f\x8b':
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if magic == b'\x28\xb5\x2f\xfd':
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed and the zstandard package is not installed")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
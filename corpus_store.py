@@ -0,0 +1,138 @@
+import os
+import json
+import sqlite3
+from datetime import datetime
+
+# One SQLite database per PDF directory holding every extracted document: its
+# metadata and, per page, the cleaned and raw text, word boxes and entities.
+# A document is written in a single transaction, so a crash never leaves it
+# half stored. The JSON/TXT files next to the PDFs become an optional export.
+
+CORPUS_DB_NAME = 'corpus.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    filename TEXT NOT NULL UNIQUE,
+    path TEXT NOT NULL,
+    extraction_date TEXT,
+    total_pages INTEGER,
+    info TEXT NOT NULL,
+    settings TEXT,
+    stored_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    page_number INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    raw_text TEXT,
+    word_count INTEGER NOT NULL,
+    source TEXT,
+    extra TEXT,
+    PRIMARY KEY (document_id, page_number)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS pages_source ON pages(source);
+"""
+
+# Page fields with a column of their own; everything else goes to `extra` as JSON
+PAGE_COLUMNS = ('page_number', 'content', 'raw_text', 'word_count', 'source')
+
+def corpus_path(directory):
+    return os.path.join(directory, CORPUS_DB_NAME)
+
+class CorpusStore:
+    def __init__(self, path):
+        self.path = path
+        # The GUI writes from its processing thread and reads from the Tk thread
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+
+    def save_document(self, pdf_data, settings=None):
+        self.save_documents([pdf_data], settings)
+
+    def save_documents(self, documents, settings=None):
+        # Replaces the stored version of every document, all in one transaction;
+        # without new settings the stored ones are kept
+        with self.connection:
+            for pdf_data in documents:
+                info = pdf_data['document_info']
+                document_settings = settings
+                if document_settings is None:
+                    row = self.connection.execute("SELECT settings FROM documents WHERE filename = ?",
+                                                  (info['filename'],)).fetchone()
+                    document_settings = json.loads(row[0]) if row and row[0] else None
+                self.connection.execute("DELETE FROM documents WHERE filename = ?", (info['filename'],))
+                cursor = self.connection.execute(
+                    "INSERT INTO documents (filename, path, extraction_date, total_pages, info, settings, stored_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (info['filename'], info['path'], info.get('extraction_date'), info.get('total_pages'),
+                     json.dumps(info, ensure_ascii=False),
+                     json.dumps(document_settings) if document_settings is not None else None,
+                     datetime.now().isoformat()))
+                self.connection.executemany(
+                    "INSERT INTO pages (document_id, page_number, content, raw_text, word_count, source, extra) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(cursor.lastrowid,) + self._page_row(page) for page in pdf_data['pages']])
+
+    def update_cleaned_pages(self, documents):
+        # Rewrites the cleaned text, word count and entities of pages already
+        # stored, plus the document info, all in one transaction. The raw text and
+        # word boxes are left untouched (json_set/json_remove edit `extra` in SQLite).
+        with self.connection:
+            for pdf_data in documents:
+                info = pdf_data['document_info']
+                row = self.connection.execute("SELECT id FROM documents WHERE filename = ?",
+                                              (info['filename'],)).fetchone()
+                if row is None:
+                    continue
+                self.connection.execute("UPDATE documents SET info = ? WHERE id = ?",
+                                        (json.dumps(info, ensure_ascii=False), row[0]))
+                self.connection.executemany(
+                    "UPDATE pages SET content = ?, word_count = ?, extra = NULLIF(CASE WHEN ? IS NULL "
+                    "THEN json_remove(COALESCE(extra, '{}'), '$.entities') "
+                    "ELSE json_set(COALESCE(extra, '{}'), '$.entities', json(?)) END, '{}') "
+                    "WHERE document_id = ? AND page_number = ?",
+                    [self._cleaned_row(row[0], page) for page in pdf_data['pages']])
+
+    def _cleaned_row(self, document_id, page):
+        entities = json.dumps(page['entities'], ensure_ascii=False) if page.get('entities') else None
+        return (page['content'], page['word_count'], entities, entities, document_id, page['page_number'])
+
+    def _page_row(self, page):
+        extra = {key: value for key, value in page.items() if key not in PAGE_COLUMNS}
+        return (page['page_number'], page['content'], page.get('raw_text'), page['word_count'],
+                page.get('source'), json.dumps(extra, ensure_ascii=False) if extra else None)
+
+    def filenames(self):
+        return [row[0] for row in self.connection.execute("SELECT filename FROM documents ORDER BY filename")]
+
+    def _page(self, row):
+        page = dict(zip(PAGE_COLUMNS, row[:5]))
+        if page['raw_text'] is None:
+            del page['raw_text']
+        if row[5]:
+            page.update(json.loads(row[5]))
+        return page
+
+    def load_document(self, filename):
+        # The document in the same shape as the exported JSON, or None
+        row = self.connection.execute("SELECT id, info FROM documents WHERE filename = ?", (filename,)).fetchone()
+        if row is None:
+            return None
+        pages = self.connection.execute(
+            "SELECT page_number, content, raw_text, word_count, source, extra FROM pages "
+            "WHERE document_id = ? ORDER BY page_number", (row[0],))
+        return {"document_info": json.loads(row[1]), "pages": [self._page(page) for page in pages]}
+
+    def load_page(self, filename, page_number):
+        row = self.connection.execute(
+            "SELECT p.page_number, p.content, p.raw_text, p.word_count, p.source, p.extra "
+            "FROM pages p JOIN documents d ON d.id = p.document_id "
+            "WHERE d.filename = ? AND p.page_number = ?", (filename, page_number)).fetchone()
+        return self._page(row) if row is not None else None
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,382 @@
+from difflib import SequenceMatcher
+from heapq import nlargest
+from bisect import bisect_left
+from array import array
+import os
+import sys
+import mmap
+import struct
+import json
+import threading
+from collections import OrderedDict
+
+# Lookup structures built once over the Portuguese word list, so that cleaning
+# OCR text does not have to scan the whole dictionary for every token.
+
+def delete_variants(word, max_distance):
+    # All strings obtained by removing up to max_distance characters from word
+    variants = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for variant in frontier:
+            for i in range(len(variant)):
+                next_frontier.add(variant[:i] + variant[i + 1:])
+        variants |= next_frontier
+        frontier = next_frontier
+    return variants
+
+def edit_distance(a, b, max_distance):
+    # Damerau-Levenshtein (optimal string alignment); returns max_distance + 1
+    # as soon as the distance is known to exceed max_distance
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+def build_delete_table(words, max_edit_distance, prefix_length):
+    deletes = {}
+    for word in words:
+        for variant in delete_variants(word[:prefix_length], max_edit_distance):
+            # Most variants map to a single word; only build lists when shared
+            entry = deletes.get(variant)
+            if entry is None:
+                deletes[variant] = word
+            elif isinstance(entry, str):
+                deletes[variant] = [entry, word]
+            else:
+                entry.append(word)
+    return deletes
+
+# SymSpell-style deletion-neighbourhood index: every dictionary word contributes
+# the delete variants of its first prefix_length characters, and a query only
+# generates its own delete variants and looks them up, so the cost of a lookup
+# does not depend on the dictionary size.
+class SymSpellIndex:
+    def __init__(self, words, max_edit_distance=2, prefix_length=7):
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.words = words
+        self.deletes = build_delete_table(words, max_edit_distance, prefix_length)
+
+    def variant_words(self, variant):
+        entry = self.deletes.get(variant)
+        if entry is None:
+            return ()
+        return (entry,) if isinstance(entry, str) else entry
+
+    def candidates(self, word, max_distance=None):
+        # Dictionary words within max_distance edits of word, with their distance
+        if max_distance is None:
+            max_distance = self.max_edit_distance
+        max_distance = min(max_distance, self.max_edit_distance)
+
+        seen = set()
+        results = []
+        for variant in delete_variants(word[:self.prefix_length], max_distance):
+            for candidate in self.variant_words(variant):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = edit_distance(word, candidate, max_distance)
+                if distance <= max_distance:
+                    results.append((candidate, distance))
+        return results
+
+    def close_matches(self, word, n=1, cutoff=0.85):
+        # Same contract as difflib.get_close_matches, restricted to candidates
+        # within max_edit_distance edits
+        if word in self.words:
+            return [word]
+        matcher = SequenceMatcher()
+        matcher.set_seq2(word)
+        scored = []
+        for candidate, _ in self.candidates(word):
+            matcher.set_seq1(candidate)
+            ratio = matcher.ratio()
+            if ratio >= cutoff:
+                scored.append((ratio, candidate))
+        return [candidate for _, candidate in nlargest(n, scored)]
+
+# Short Portuguese function words that often glue OCR'd words together
+# ("estadoriodejaneiro"); they are accepted while segmenting but not returned,
+# like every other word of two letters or less
+CONNECTOR_WORDS = ('a', 'o', 'e', 'as', 'os', 'ao', 'da', 'de', 'do', 'em', 'na', 'no', 'um', 'ou', 'se')
+
+# Implicit trie over the sorted word list: walking a text one character at a
+# time narrows the [lo, hi) range of words sharing the current prefix, and the
+# walk stops as soon as no dictionary word starts with it. This gives the
+# prefix queries of a trie without a node per character in memory.
+class SortedWordTrie:
+    def __init__(self, words, connectors=CONNECTOR_WORDS, presorted=False):
+        self.words = words if presorted else sorted(words)
+        self.connectors = connectors
+
+    def word_ends(self, text, start):
+        # Yields every end such that text[start:end] is a dictionary word
+        words = self.words
+        lo, hi = 0, len(words)
+        for end in range(start + 1, len(text) + 1):
+            prefix = text[start:end]
+            lo = bisect_left(words, prefix, lo, hi)
+            hi = bisect_left(words, prefix + '\U0010ffff', lo, hi)
+            if lo >= hi:
+                return
+            if words[lo] == prefix:
+                yield end
+
+    def segment(self, text, min_word_length=3):
+        # Dynamic programming over split points; the best split uses the fewest
+        # words. Only splits covering the whole text are accepted: a token with
+        # characters that belong to no word is a misspelling, not a compound, and
+        # is left to the fuzzy matcher.
+        n = len(text)
+        best = [None] * (n + 1)
+        best[0] = (0, None, False)  # (pieces, previous position, keep piece)
+        for start in range(n):
+            if best[start] is None:
+                continue
+            pieces = best[start][0]
+            ends = [(end, True) for end in self.word_ends(text, start) if end - start >= min_word_length]
+            ends += [(start + len(c), False) for c in self.connectors if text.startswith(c, start)]
+            for end, is_word in ends:
+                if best[end] is None or pieces + 1 < best[end][0]:
+                    best[end] = (pieces + 1, start, is_word)
+
+        if best[n] is None:
+            return []
+
+        words = []
+        end = n
+        while end > 0:
+            _, start, is_word = best[end]
+            if is_word:
+                words.append(text[start:end])
+            end = start
+        words.reverse()
+        return words
+
+# Bounded LRU memo from a raw OCR token to its corrected words (an empty tuple
+# records a rejected token). OCR output repeats the same misspellings on page
+# after page, so most tokens skip the dictionary lookups entirely. The signature
+# identifies the cleaning settings; a saved memo is only reused when it matches.
+class CorrectionMemo:
+    def __init__(self, maxsize=200000, signature=''):
+        self.maxsize = maxsize
+        self.signature = signature
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Pipeline clean stages may share the memo between threads
+        self.lock = threading.Lock()
+
+    def get(self, token):
+        with self.lock:
+            corrected = self.entries.get(token)
+            if corrected is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(token)
+            self.hits += 1
+            return corrected
+
+    def put(self, token, corrected):
+        with self.lock:
+            self.entries[token] = tuple(corrected)
+            self.entries.move_to_end(token)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def save(self, path):
+        with self.lock:
+            entries = list(self.entries.items())
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'signature': self.signature, 'entries': entries},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, maxsize=200000, signature=''):
+        memo = cls(maxsize, signature)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return memo
+        if data.get('signature') == signature:
+            for token, corrected in data['entries'][-maxsize:]:
+                memo.entries[token] = tuple(corrected)
+        return memo
+
+# Compiled dictionary artifact
+#
+# The word list and the SymSpell delete table are written once into a single
+# binary file that is memory-mapped read-only. Loading it costs no parsing, and
+# every worker process maps the same file, so the operating system keeps one
+# copy of the pages for all of them.
+#
+# Layout (little-endian, every section 4-byte aligned):
+#   header: magic, version, max_edit_distance, prefix_length,
+#           word count, word blob size, delete count, delete blob size, posting count
+#   word offsets (count + 1 x uint32), word blob (sorted UTF-8 words)
+#   delete offsets (count + 1 x uint32), delete blob (sorted UTF-8 delete variants)
+#   posting offsets (delete count + 1 x uint32), postings (uint32 word ids)
+
+DICTIONARY_MAGIC = b'WDIC'
+DICTIONARY_VERSION = 1
+_HEADER = struct.Struct('<4s8I')
+
+def read_word_list(path, min_length=3):
+    with open(path, 'r', encoding='utf-8') as f:
+        return {word.strip().lower() for word in f if len(word.strip()) >= min_length}
+
+def _pack_strings(strings):
+    offsets = array('I', [0])
+    blob = bytearray()
+    for string in strings:
+        blob += string.encode('utf-8')
+        offsets.append(len(blob))
+    blob += b'\0' * (-len(blob) % 4)
+    return offsets, bytes(blob)
+
+def compile_dictionary(words, out_path, max_edit_distance=2, prefix_length=7):
+    words = sorted(words)
+    word_ids = {word: i for i, word in enumerate(words)}
+    deletes = build_delete_table(words, max_edit_distance, prefix_length)
+    variants = sorted(deletes)
+
+    posting_offsets = array('I', [0])
+    postings = array('I')
+    for variant in variants:
+        entry = deletes[variant]
+        postings.extend(word_ids[word] for word in ((entry,) if isinstance(entry, str) else entry))
+        posting_offsets.append(len(postings))
+
+    word_offsets, word_blob = _pack_strings(words)
+    delete_offsets, delete_blob = _pack_strings(variants)
+    for section in (word_offsets, delete_offsets, posting_offsets, postings):
+        if sys.byteorder != 'little':
+            section.byteswap()
+
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(DICTIONARY_MAGIC, DICTIONARY_VERSION, max_edit_distance, prefix_length,
+                             len(words), len(word_blob), len(variants), len(delete_blob), len(postings)))
+        for section in (word_offsets, word_blob, delete_offsets, delete_blob, posting_offsets, postings):
+            f.write(section)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+# Read-only sequence of strings stored in the mapped file; supports len(),
+# indexing and therefore bisect, decoding only the entries that are touched
+class MappedStrings:
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def index(self, string, lo=0, hi=None):
+        # Position of string, or -1 when absent
+        i = bisect_left(self, string, lo, len(self) if hi is None else hi)
+        if i < len(self) and self[i] == string:
+            return i
+        return -1
+
+class CompiledDictionary:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        (magic, version, self.max_edit_distance, self.prefix_length, word_count, word_blob_size,
+         delete_count, delete_blob_size, posting_count) = _HEADER.unpack_from(view)
+        if magic != DICTIONARY_MAGIC or version != DICTIONARY_VERSION:
+            raise ValueError(f"{path} is not a compiled dictionary (version {DICTIONARY_VERSION})")
+        if sys.byteorder != 'little':
+            raise ValueError("Compiled dictionaries can only be mapped on little-endian machines")
+
+        position = _HEADER.size
+        def take(size):
+            nonlocal position
+            section = view[position:position + size]
+            position += size
+            return section
+
+        self.words = MappedStrings(take(4 * (word_count + 1)).cast('I'), take(word_blob_size))
+        self.deletes = MappedStrings(take(4 * (delete_count + 1)).cast('I'), take(delete_blob_size))
+        self.posting_offsets = take(4 * (delete_count + 1)).cast('I')
+        self.postings = take(4 * posting_count).cast('I')
+
+    def __contains__(self, word):
+        return self.words.index(word) >= 0
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+    def fuzzy_index(self):
+        return MappedSymSpellIndex(self)
+
+    def segmenter(self, connectors=CONNECTOR_WORDS):
+        return SortedWordTrie(self.words, connectors, presorted=True)
+
+# SymSpellIndex reading its delete table from a CompiledDictionary
+class MappedSymSpellIndex(SymSpellIndex):
+    def __init__(self, dictionary):
+        self.max_edit_distance = dictionary.max_edit_distance
+        self.prefix_length = dictionary.prefix_length
+        self.words = dictionary
+        self.dictionary = dictionary
+
+    def variant_words(self, variant):
+        i = self.dictionary.deletes.index(variant)
+        if i < 0:
+            return ()
+        offsets = self.dictionary.posting_offsets
+        words = self.dictionary.words
+        return [words[word_id] for word_id in self.dictionary.postings[offsets[i]:offsets[i + 1]]]
+
+if __name__ == "__main__":
+    # Compile every word list given on the command line (default: both
+    # Portuguese lists) into a .dict artifact next to it
+    word_lists = sys.argv[1:] or ['c:\\Dev\\Whoosh\\portuguese_words.txt',
+                                  'c:\\Dev\\Whoosh\\portuguese_words_Semacentos.txt']
+    for word_list in word_lists:
+        out_path = os.path.splitext(word_list)[0] + '.dict'
+        print(f"Compiling {word_list} -> {out_path}")
+        compile_dictionary(read_word_list(word_list), out_path)
+    print("Done!")
@@ -0,0 +1,120 @@
+import os
+import re
+import json
+from datetime import date
+
+# Identifiers that clean_text throws away (process numbers, CPFs, dates, years),
+# pulled from the raw page text and kept in an exact-match index:
+#   {kind: {normalized value: [[pdf filename, page number], ...]}}
+# A lookup is one dict access, no JSON file has to be opened.
+
+ENTITY_INDEX_NAME = '.entity_index.json'
+
+# "E-01-726-390-92", "E-01/732.010/1987"; OCR often puts spaces around the
+# separators and may read the prefix in lowercase (stored uppercased)
+PROCESS_PATTERN = re.compile(r'\b([A-Z]{1,3}) ?- ?(\d{2})((?: ?[-/.] ?\d{2,6}){2,4})\b', re.IGNORECASE)
+# CNJ numbering of court cases: NNNNNNN-DD.AAAA.J.TR.OOOO
+CNJ_PATTERN = re.compile(r'\b\d{7}-\d{2}\.\d{4}\.\d\.\d{2}\.\d{4}\b')
+# Formatted CPFs, or eleven digits right after the word CPF
+CPF_PATTERN = re.compile(r'\b(\d{3})\.(\d{3})\.(\d{3})-(\d{2})\b|\bCPF[:\s]*(\d{11})\b', re.IGNORECASE)
+DATE_PATTERN = re.compile(r'\b(\d{1,2})[/.-](\d{1,2})[/.-](\d{4}|\d{2})\b')
+MONTHS = ['janeiro', 'fevereiro', 'março', 'abril', 'maio', 'junho',
+          'julho', 'agosto', 'setembro', 'outubro', 'novembro', 'dezembro']
+LONG_DATE_PATTERN = re.compile(r'\b(\d{1,2}) de (' + '|'.join(MONTHS) + r') de (\d{4})\b', re.IGNORECASE)
+YEAR_PATTERN = re.compile(r'\b(19\d{2}|20\d{2})\b')
+
+ENTITY_KINDS = ('process', 'cpf', 'date', 'year')
+
+def normalize_process_number(text):
+    # Uppercase, every separator turned into '-'; spaces around a separator are
+    # dropped and spaces alone count as one ("E 01 726 390 92")
+    text = re.sub(r'\s*([-/.])\s*', r'\1', text.upper().strip())
+    return re.sub(r'[/.\s]+', '-', text)
+
+def iso_date(day, month, year):
+    day, month, year = int(day), int(month), int(year)
+    if year < 100:
+        year += 2000 if year < 50 else 1900
+    if not 1900 <= year <= 2100:
+        return None
+    try:
+        # Rejects days the month does not have (31/02, 29/02 of a common year)
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+def extract_entities(text):
+    # {kind: sorted values} of the identifiers found in a page's raw text
+    entities = {kind: set() for kind in ENTITY_KINDS}
+    for match in PROCESS_PATTERN.finditer(text):
+        entities['process'].add(normalize_process_number(match.group(0)))
+    for match in CNJ_PATTERN.finditer(text):
+        entities['process'].add(match.group(0))
+    for match in CPF_PATTERN.finditer(text):
+        entities['cpf'].add(''.join(g for g in match.groups() if g))
+    for match in DATE_PATTERN.finditer(text):
+        date = iso_date(*match.groups())
+        if date:
+            entities['date'].add(date)
+    for match in LONG_DATE_PATTERN.finditer(text):
+        date = iso_date(match.group(1), MONTHS.index(match.group(2).lower()) + 1, match.group(3))
+        if date:
+            entities['date'].add(date)
+    entities['year'].update(YEAR_PATTERN.findall(text))
+    return {kind: sorted(values) for kind, values in entities.items() if values}
+
+def normalize_query(kind, text):
+    # The form a user types, reduced to the form stored in the index
+    text = text.strip()
+    if kind == 'process':
+        return text if CNJ_PATTERN.fullmatch(text) else normalize_process_number(text)
+    if kind == 'cpf':
+        return re.sub(r'\D', '', text)
+    if kind == 'date':
+        match = DATE_PATTERN.fullmatch(text)
+        return iso_date(*match.groups()) if match else text
+    return text
+
+class EntityIndex:
+    def __init__(self, directory):
+        self.path = os.path.join(directory, ENTITY_INDEX_NAME)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+        # filename -> {(kind, value), ...}, so removing a document only touches
+        # its own values; derived from the entries, not saved
+        self.documents = {}
+        for kind, values in self.entries.items():
+            for value, hits in values.items():
+                for filename, _ in hits:
+                    self.documents.setdefault(filename, set()).add((kind, value))
+
+    def remove_document(self, filename):
+        for kind, value in self.documents.pop(filename, ()):
+            values = self.entries[kind]
+            values[value] = [hit for hit in values[value] if hit[0] != filename]
+            if not values[value]:
+                del values[value]
+
+    def add_document(self, filename, pages):
+        # Replaces whatever the index held for this PDF with the entities of its pages
+        self.remove_document(filename)
+        for page in pages:
+            for kind, values in page.get('entities', {}).items():
+                kind_entries = self.entries.setdefault(kind, {})
+                for value in values:
+                    kind_entries.setdefault(value, []).append([filename, page['page_number']])
+                    self.documents.setdefault(filename, set()).add((kind, value))
+
+    def lookup(self, kind, text):
+        # [(pdf filename, page number), ...] where the identifier appears
+        value = normalize_query(kind, text)
+        return [tuple(hit) for hit in self.entries.get(kind, {}).get(value, [])]
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
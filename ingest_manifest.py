@@ -0,0 +1,63 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+
+# Records which PDFs of a directory were already processed, so a run only
+# touches files that are new, changed, or were processed with other settings.
+
+MANIFEST_NAME = '.ingest_manifest'
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class IngestionManifest:
+    def __init__(self, directory):
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def needs_processing(self, pdf_path, settings):
+        # Returns (True/False, reason)
+        name = os.path.basename(pdf_path)
+        entry = self.entries.get(name)
+        if entry is None:
+            return True, "new"
+        if entry['settings'] != settings:
+            return True, "settings changed"
+        if not all(os.path.exists(path) for path in entry.get('outputs', [])):
+            return True, "outputs missing"
+
+        stat = os.stat(pdf_path)
+        if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return False, "unchanged"
+
+        # Size or mtime moved (copy, touch, re-download): only the content hash decides
+        if entry['size'] == stat.st_size and entry['sha256'] == file_sha256(pdf_path):
+            entry['mtime'] = stat.st_mtime
+            return False, "unchanged content"
+        return True, "changed"
+
+    def record(self, pdf_path, settings, outputs):
+        stat = os.stat(pdf_path)
+        self.entries[os.path.basename(pdf_path)] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha256': file_sha256(pdf_path),
+            'settings': settings,
+            'outputs': list(outputs),
+            'processed_at': datetime.now().isoformat()
+        }
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.path)
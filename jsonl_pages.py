@@ -0,0 +1,91 @@
+import os
+import json
+from array import array
+
+# Page-per-line output: <name>.jsonl holds one JSON object per page, written as
+# each page finishes, and a last line with the document_info. <name>.jsonl.idx
+# is an array of 64-bit byte offsets: slot 0 is the document_info line, slot N
+# is page N (-1 when the page has no line). Loading page N is one seek and one
+# readline, whatever the size of the document.
+
+JSONL_SUFFIX = '.jsonl'
+INDEX_SUFFIX = '.jsonl.idx'
+
+class JsonlPageWriter:
+    def __init__(self, base_name):
+        self.path = base_name + JSONL_SUFFIX
+        self.index_path = base_name + INDEX_SUFFIX
+        self.file = open(self.path, 'wb')
+        self.offsets = {}
+
+    def _write_line(self, record):
+        offset = self.file.tell()
+        self.file.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        return offset
+
+    def write_page(self, page):
+        self.offsets[page['page_number']] = self._write_line(page)
+        self.file.flush()
+
+    def write_missing(self, pages):
+        # Pages that did not go through write_page, e.g. taken from a resume journal
+        for page in pages:
+            if page['page_number'] not in self.offsets:
+                self.write_page(page)
+
+    def close(self, document_info):
+        info_offset = self._write_line(document_info)
+        self.file.close()
+        slots = max(self.offsets, default=0) + 1
+        offsets = array('q', [-1]) * slots
+        offsets[0] = info_offset
+        for page_number, offset in self.offsets.items():
+            offsets[page_number] = offset
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            offsets.tofile(f)
+        os.replace(tmp_path, self.index_path)
+        return self.path
+
+    def abort(self):
+        # Drops an unfinished output (the document failed)
+        if not self.file.closed:
+            self.file.close()
+            os.remove(self.path)
+
+class JsonlPageReader:
+    def __init__(self, path):
+        base_name = path[:-len(JSONL_SUFFIX)] if path.endswith(JSONL_SUFFIX) else path
+        self.offsets = array('q')
+        with open(base_name + INDEX_SUFFIX, 'rb') as f:
+            self.offsets.frombytes(f.read())
+        self.file = open(base_name + JSONL_SUFFIX, 'rb')
+
+    def _read_line(self, offset):
+        self.file.seek(offset)
+        return json.loads(self.file.readline())
+
+    def document_info(self):
+        return self._read_line(self.offsets[0])
+
+    def page_numbers(self):
+        return [n for n in range(1, len(self.offsets)) if self.offsets[n] >= 0]
+
+    def page(self, page_number):
+        if not 0 < page_number < len(self.offsets) or self.offsets[page_number] < 0:
+            return None
+        return self._read_line(self.offsets[page_number])
+
+    def pages(self):
+        # In page order, one line in memory at a time
+        for page_number in self.page_numbers():
+            yield self.page(page_number)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
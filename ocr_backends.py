@@ -0,0 +1,109 @@
+import os
+import threading
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# OCR engines behind one interface:
+#   image_to_string(image) -> text
+#   image_to_words(image)  -> [{"text", "conf", "line", "box": (x0, y0, x1, y1)}] in reading order
+#   version()              -> engine version, part of the OCR cache key
+
+class PytesseractBackend:
+    # Starts one tesseract subprocess per call: the image goes through a temp
+    # file and the language model is loaded again for every page
+    name = 'pytesseract'
+
+    def __init__(self, lang):
+        self.lang = lang
+
+    def version(self):
+        return f"{self.name} {pytesseract.get_tesseract_version()}"
+
+    def image_to_string(self, image):
+        return pytesseract.image_to_string(image, lang=self.lang)
+
+    def image_to_words(self, image):
+        data = pytesseract.image_to_data(image, lang=self.lang, output_type=pytesseract.Output.DICT)
+        words = []
+        for i, text in enumerate(data['text']):
+            if not text.strip():
+                continue
+            left, top = data['left'][i], data['top'][i]
+            words.append({
+                "text": text,
+                "conf": float(data['conf'][i]),
+                "line": (data['block_num'][i], data['par_num'][i], data['line_num'][i]),
+                "box": (left, top, left + data['width'][i], top + data['height'][i])
+            })
+        return words
+
+class TesserocrBackend:
+    # Keeps one Tesseract engine, with the language model loaded, for the whole
+    # life of the process and hands it images through memory
+    name = 'tesserocr'
+
+    def __init__(self, lang):
+        tessdata = os.environ.get('TESSDATA_PREFIX')
+        if tessdata:
+            self.api = tesserocr.PyTessBaseAPI(path=tessdata.rstrip('\\/') + os.sep, lang=lang)
+        else:
+            self.api = tesserocr.PyTessBaseAPI(lang=lang)
+
+    def version(self):
+        return f"{self.name} {tesserocr.tesseract_version().splitlines()[0]}"
+
+    def image_to_string(self, image):
+        self.api.SetImage(image)
+        return self.api.GetUTF8Text()
+
+    def image_to_words(self, image):
+        self.api.SetImage(image)
+        self.api.Recognize()
+        iterator = self.api.GetIterator()
+        if iterator is None:
+            return []
+
+        words = []
+        line = 0
+        level = tesserocr.RIL.WORD
+        for word in tesserocr.iterate_level(iterator, level):
+            if word.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                line += 1
+            text = word.GetUTF8Text(level)
+            if not text or not text.strip():
+                continue
+            words.append({
+                "text": text,
+                "conf": float(word.Confidence(level)),
+                "line": line,
+                "box": tuple(word.BoundingBox(level))
+            })
+        return words
+
+OCR_BACKENDS = {
+    'pytesseract': PytesseractBackend,
+    'tesserocr': TesserocrBackend
+}
+
+# Engines are not thread-safe, so every thread (and process) gets its own,
+# created on first use and kept for the rest of its life
+_local = threading.local()
+_warned = set()
+
+def get_ocr_backend(name, lang):
+    if name == 'tesserocr' and tesserocr is None:
+        if name not in _warned:
+            _warned.add(name)
+            print("tesserocr is not installed, falling back to pytesseract")
+        name = 'pytesseract'
+
+    backends = getattr(_local, 'backends', None)
+    if backends is None:
+        backends = _local.backends = {}
+    if (name, lang) not in backends:
+        backends[(name, lang)] = OCR_BACKENDS[name](lang)
+    return backends[(name, lang)]
@@ -0,0 +1,45 @@
+import os
+import hashlib
+import tempfile
+
+# Persistent OCR result cache. Entries are keyed by a hash of the rendered page
+# pixels plus every setting that changes Tesseract's output, so a page that was
+# already OCR'd (in this document or any other) never goes through Tesseract again.
+
+class OCRCache:
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, image, **settings):
+        digest = hashlib.sha256()
+        digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}".encode())
+        for name in sorted(settings):
+            digest.update(f"|{name}={settings[name]}".encode())
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        # Two-level fan-out keeps directories small on large corpora
+        return os.path.join(self.directory, key[:2], f"{key}.txt")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return text
+
+    def put(self, key, text):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so parallel workers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
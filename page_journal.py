@@ -0,0 +1,73 @@
+import os
+import json
+
+# Per-document journal of finished pages (JSON Lines). The first line describes
+# the PDF and the settings; every following line is one finished page, written
+# as soon as the page is done. A run that crashes leaves the journal behind, and
+# the next run over the same PDF with the same settings resumes from it.
+
+JOURNAL_SUFFIX = '.pages.jsonl'
+
+def journal_path_for(base_name):
+    return f"{base_name}{JOURNAL_SUFFIX}"
+
+class PageJournal:
+    def __init__(self, path, pdf_path, settings):
+        self.path = path
+        stat = os.stat(pdf_path)
+        self.header = {
+            "journal": 1,
+            "filename": os.path.basename(pdf_path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "settings": settings
+        }
+        self.pages = self._load()
+        resuming = bool(self.pages)
+        self.file = open(path, 'a' if resuming else 'w', encoding='utf-8')
+        if not resuming:
+            self._write(self.header)
+
+    def _load(self):
+        # Pages of an earlier run, or nothing if that run used another file or settings
+        pages = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = iter(f)
+                header = json.loads(next(lines))
+                if header != json.loads(json.dumps(self.header)):
+                    return {}
+                for line in lines:
+                    try:
+                        page = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # Last line cut short by the crash
+                    pages[page["page_number"]] = page
+        except (FileNotFoundError, StopIteration, json.JSONDecodeError):
+            return {}
+        if pages:
+            # Drop a partial last line so new pages start on a line of their own
+            self._rewrite(pages)
+        return pages
+
+    def _rewrite(self, pages):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in [self.header] + [pages[n] for n in sorted(pages)]:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def append(self, page):
+        self.pages[page["page_number"]] = page
+        self._write(page)
+
+    def close(self):
+        self.file.close()
+
+def remove_journal(path):
+    if os.path.exists(path):
+        os.remove(path)
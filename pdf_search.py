@@ -1,55 +1,116 @@
 import os
 import json
+import hashlib
 import fitz  # PyMuPDF
-from whoosh.index import create_in
+from whoosh.index import create_in, open_dir, exists_in
 from whoosh.fields import Schema, TEXT, ID, NUMERIC
 from whoosh.qparser import QueryParser
+from word_boxes import load_page_words, find_word_boxes
+from searchable_pdf import preferred_pdf_path
+from compressed_io import open_text, find_output
 
-def create_searchable_index(txt_path, pdf_path):
-    # Create schema for the search index
-    schema = Schema(
+INDEX_DIR = "indexdir"
+# Changed pages per writer process before update_index uses more than one
+INDEX_PAGES_PER_PROCESS = 2000
+
+def index_schema():
+    # key identifies a page (pdf_path + page number) so a page can be replaced;
+    # content_hash tells whether its text changed since it was indexed
+    return Schema(
+        key=ID(unique=True),
         content=TEXT(stored=True),
         page_number=NUMERIC(stored=True),
-        pdf_path=ID(stored=True)
+        pdf_path=ID(stored=True),
+        content_hash=ID(stored=True)
     )
-    
-    # Create index directory if it doesn't exist
-    if not os.path.exists("indexdir"):
-        os.mkdir("indexdir")
-    
-    # Create index
-    ix = create_in("indexdir", schema)
-    writer = ix.writer()
-    
-    # Read the text file and index content by page
-    with open(txt_path, 'r', encoding='utf-8') as f:
+
+def page_key(pdf_path, page_number):
+    return f"{pdf_path}#{page_number}"
+
+def content_hash(content):
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def read_txt_pages(txt_path):
+    # Yields (page_number, content) for every page of a TXT written by save_to_txt,
+    # plain or compressed (exemplo.txt also finds exemplo.txt.gz)
+    with open_text(find_output(txt_path) or txt_path) as f:
         current_page = None
         current_content = []
         
         for line in f:
             if line.startswith('Page '):
-                # If we have content from previous page, index it
+                # If we have content from previous page, yield it
                 if current_page is not None and current_content:
-                    writer.add_document(
-                        content='\n'.join(current_content),
-                        page_number=current_page,
-                        pdf_path=pdf_path
-                    )
-                # Start new page
+                    yield current_page, '\n'.join(current_content).strip()
+                # Start new page; its first line is the dashed separator
                 current_page = int(line.split()[1])
                 current_content = []
+                next(f, None)
             else:
                 current_content.append(line.strip())
     
-    # Add the last page
+    # The last page
     if current_page is not None and current_content:
-        writer.add_document(
-            content='\n'.join(current_content),
-            page_number=current_page,
-            pdf_path=pdf_path
-        )
+        yield current_page, '\n'.join(current_content).strip()
+
+def open_index(index_dir=INDEX_DIR):
+    # Opens the index, creating it on first use. An index written before pages
+    # had a unique key cannot be updated in place and is started over.
+    if not os.path.exists(index_dir):
+        os.mkdir(index_dir)
+    if exists_in(index_dir):
+        ix = open_dir(index_dir)
+        if 'key' in ix.schema and 'content_hash' in ix.schema:
+            return ix
+        print(f"Index in {index_dir} has an old schema, recreating it")
+    return create_in(index_dir, index_schema())
+
+def update_index(documents, index_dir=INDEX_DIR, procs=1):
+    # documents: (pdf_path, pages) pairs, pages yielding (page_number, content).
+    # Only new or changed pages are written and pages a document no longer has
+    # are deleted, so adding one document costs its own pages, not the index size.
+    ix = open_index(index_dir)
+    counts = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    writes = []
+    deletes = []
+    with ix.searcher() as searcher:
+        for pdf_path, pages in documents:
+            stored = {fields['page_number']: fields['content_hash']
+                      for fields in searcher.documents(pdf_path=pdf_path)}
+            seen = set()
+            for page_number, content in pages:
+                seen.add(page_number)
+                digest = content_hash(content)
+                if stored.get(page_number) == digest:
+                    counts["unchanged"] += 1
+                    continue
+                writes.append({"key": page_key(pdf_path, page_number), "content": content,
+                               "page_number": page_number, "pdf_path": pdf_path, "content_hash": digest})
+                counts["updated" if page_number in stored else "added"] += 1
+            for page_number in set(stored) - seen:
+                deletes.append(page_key(pdf_path, page_number))
+                counts["deleted"] += 1
     
+    if not writes and not deletes:
+        return ix, counts
+    # Worker processes only pay off on large updates, and a Whoosh subwriter
+    # that receives no pages crashes; each one gets INDEX_PAGES_PER_PROCESS+ pages
+    procs = max(1, min(procs, len(writes) // INDEX_PAGES_PER_PROCESS))
+    writer = ix.writer(procs=procs, limitmb=256) if procs > 1 else ix.writer(limitmb=256)
+    try:
+        for fields in writes:
+            writer.update_document(**fields)
+        for key in deletes:
+            writer.delete_by_term('key', key)
+    except BaseException:
+        writer.cancel()
+        raise
     writer.commit()
+    return ix, counts
+
+def create_searchable_index(txt_path, pdf_path):
+    # Adds (or refreshes) one document in the existing index
+    ix, _ = update_index([(pdf_path, read_txt_pages(txt_path))])
     return ix
 
 def search_and_show_pdf(query_text, index):
@@ -63,16 +124,21 @@ def search_and_show_pdf(query_text, index):
         
         # Open PDF document
         pdf_path = results[0]['pdf_path']
-        doc = fitz.open(pdf_path)
+        doc = fitz.open(preferred_pdf_path(pdf_path))
+        page_words = load_page_words(pdf_path)
         
         for hit in results:
             page_num = hit['page_number']
             print(f"\nFound in page {page_num}:")
             print(f"Context: {hit.highlights('content')}\n")
             
-            # Get the page and highlight the text
+            # Get the page and highlight the text from the word boxes stored at
+            # ingestion; older JSON files without boxes fall back to search_for
             page = doc.load_page(page_num - 1)
-            text_instances = page.search_for(query_text)
+            if page_words:
+                text_instances = [fitz.Rect(box) for box in find_word_boxes(page_words.get(page_num), query_text)]
+            else:
+                text_instances = page.search_for(query_text)
             for inst in text_instances:
                 highlight = page.add_highlight_annot(inst)
                 highlight.set_colors(stroke=(1, 1, 0))  # Yellow highlight
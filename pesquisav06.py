@@ -1,10 +1,30 @@
 import os
+import sys
 import json
 from pdf2image import convert_from_path
 import pytesseract
+import fitz  # PyMuPDF
+from PIL import Image
 from datetime import datetime
 import re
+import time
+import threading
+import numpy as np
 from difflib import get_close_matches
+from concurrent.futures import ProcessPoolExecutor
+from pipeline import Pipeline
+from ocr_cache import OCRCache
+from ocr_backends import get_ocr_backend
+from ingest_manifest import IngestionManifest
+from word_boxes import pack_ocr_words, pack_text_layer_words, page_derotations, page_space_words
+from searchable_pdf import write_searchable_pdf, sidecar_path, is_sidecar
+from entity_index import EntityIndex, extract_entities
+from corpus_store import CorpusStore, corpus_path
+from jsonl_pages import JsonlPageWriter
+from compressed_io import open_output
+from page_journal import PageJournal, journal_path_for, remove_journal
+from scheduler import PageScheduler
+from dictionary_index import SymSpellIndex, SortedWordTrie, CompiledDictionary, CorrectionMemo, CONNECTOR_WORDS
 
 # funcionando  e criando o json e o txt
 
@@ -13,18 +33,183 @@ pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tessera
 os.environ['TESSDATA_PREFIX'] = r'C:\Program Files\Tesseract-OCR\tessdata'
 os.environ['PATH'] += r';C:\poppler-24.08.0\Library\bin'
 
+# OCR settings; they are also part of the OCR cache key
+OCR_DPI = 300
+OCR_LANG = 'por'
+
+# OCR engine: 'tesserocr' keeps a Tesseract engine with the model loaded in
+# every worker and passes images in memory; 'pytesseract' starts one tesseract
+# subprocess per page (used automatically when tesserocr is not installed)
+OCR_BACKEND = 'tesserocr'
+
+# Page rasterizer: 'poppler' (pdf2image, one pdftoppm subprocess per run of
+# pages) or 'pymupdf' (rendered in-process by fitz, no subprocess or PPM files)
+RENDER_BACKEND = 'poppler'
+
+# Directory of the persistent OCR result cache (None disables it)
+OCR_CACHE_DIR = 'c:\\Dev\\Whoosh\\ocr_cache'
+
+# Fuzzy matcher used by clean_text: 'symspell' (precomputed index) or 'difflib'
+# (linear get_close_matches scan, kept to compare results)
+FUZZY_MATCHER = 'symspell'
+
+# Number of processes used for page OCR (1 keeps everything in the current process)
+OCR_WORKERS = os.cpu_count() or 1
+
+# Pages rasterized per poppler call; only this many page images (plus the ones
+# waiting on OCR) are held in memory at any time
+RENDER_WINDOW = 2
+
+# Page image preparation before OCR. Pages are rendered in grayscale (one byte
+# per pixel instead of three) and go through PREPARE_STEPS in order. The steps
+# ('threshold', 'deskew', 'despeckle') cost 80-175 ms per page each and are off
+# until benchmark.py shows they raise OCR confidence on the corpus.
+IMAGE_GRAYSCALE = True
+PREPARE_STEPS = ()
+DESKEW_MAX_ANGLE = 3.0
+DESKEW_ANGLE_STEP = 0.25
+DESPECKLE_MIN_NEIGHBOURS = 2
+
+# Adaptive resolution: OCR first at ADAPTIVE_LOW_DPI and only re-render and
+# re-OCR at OCR_DPI the pages whose mean word confidence is below the threshold
+ADAPTIVE_DPI = False
+ADAPTIVE_LOW_DPI = 200
+ADAPTIVE_MIN_CONFIDENCE = 80.0
+
+# Blank page detection on a downsampled grayscale copy of each rendered page.
+# 'skip' leaves blank pages out of OCR, 'tag' still OCRs them but marks them in
+# the JSON, None turns the check off. A page is blank when, inside the margins,
+# almost no pixel is clearly darker than the paper or the image is nearly flat.
+BLANK_PAGE_MODE = 'skip'
+BLANK_DOWNSAMPLE = 8
+BLANK_MARGIN = 0.05
+BLANK_INK_CONTRAST = 60
+BLANK_MAX_INK_RATIO = 0.003
+BLANK_MIN_STD = 4.0
+
+# Worker threads of the rasterize and clean pipeline stages (the OCR stage uses
+# the `workers` argument) and the size of the queues between stages
+RASTER_WORKERS = 2
+CLEAN_WORKERS = 1
+PIPELINE_QUEUE_SIZE = 4
+
+# A page's own text layer is used instead of OCR when it has at least this many
+# non-space characters and most of them are letters. A page mostly covered by
+# images is a scan: its layer is only trusted when the words span a good part of
+# the page, a signature stamp alone ("Digitally signed by ...") does not count.
+TEXT_LAYER_MIN_CHARS = 50
+TEXT_LAYER_MIN_LETTER_RATIO = 0.6
+TEXT_LAYER_SCAN_IMAGE_COVERAGE = 0.5
+TEXT_LAYER_SCAN_MIN_SPAN = 0.25
+
+# Unchanged PDFs skipped by a run are listed by name up to this many, then counted
+SKIPPED_REPORT_LIMIT = 20
+
+# Documents are stored in the corpus database (corpus_store.py); the JSON and TXT
+# files next to each PDF are an optional export
+EXPORT_JSON_TXT = True
+# Compression of the JSON/TXT exports: None, 'gzip' or 'zstd' (needs zstandard,
+# falls back to gzip). Every reader opens plain and compressed files alike.
+OUTPUT_COMPRESSION = 'gzip'
+# <name>.jsonl, one page per line written as pages finish, with a page offset index
+EXPORT_JSONL = True
+
+# Also write <name>.ocr.pdf, a copy of the PDF with the OCR text as an invisible layer
+SEARCHABLE_PDF = True
+
+# Word list and its compiled artifact (built with `python dictionary_index.py`)
+DICTIONARY_PATH = 'c:\\Dev\\Whoosh\\portuguese_words.txt'
+COMPILED_DICTIONARY_PATH = 'c:\\Dev\\Whoosh\\portuguese_words.dict'
+
+# Token correction: minimum fuzzy match ratio, tokens shorter than
+# CLEAN_MIN_WORD_LENGTH are dropped, tokens longer than SPLIT_MIN_TOKEN_LENGTH
+# may be split into SEGMENT_MIN_WORD_LENGTH+ letter words and connectors.
+# All of them are part of the correction memo signature.
+CORRECTION_CUTOFF = 0.85
+CLEAN_MIN_WORD_LENGTH = 3
+SPLIT_MIN_TOKEN_LENGTH = 13
+SEGMENT_MIN_WORD_LENGTH = 3
+SEGMENT_CONNECTORS = CONNECTOR_WORDS
+
+# Memo of token corrections shared by every page and document of a run, and
+# the file it is kept in between runs (None keeps it in memory only)
+CORRECTION_MEMO_SIZE = 200000
+CORRECTION_MEMO_PATH = 'c:\\Dev\\Whoosh\\correction_memo.json'
+
+# Dictionary lookup structures and correction memo, loaded once per process,
+# and the OCR cache opened by each OCR worker process
+_lexicon = None
+_correction_memo = None
+_worker_cache = None
+_engine_versions = {}
+
+# OCR time spent and (estimated) saved by blank page detection in this process
+ocr_counters = {"ocr_pages": 0, "ocr_seconds": 0.0, "blank_pages": 0, "ocr_seconds_saved": 0.0}
+_ocr_counters_lock = threading.Lock()
+
+# Time spent in each image preparation step in this process: step -> [pages, seconds]
+image_prep_timings = {}
+
 def load_portuguese_dictionary():
     try:
-        with open('c:\\Dev\\Whoosh\\portuguese_words.txt', 'r', encoding='utf-8') as f:
+        with open(DICTIONARY_PATH, 'r', encoding='utf-8') as f:
             return {word.strip().lower() for word in f if len(word.strip()) > 2}  # Minimum 3 characters
     except FileNotFoundError:
         print("Dictionary file not found!")
         return set()
 
-def find_similar_words(word, dictionary, cutoff=0.85):  # Increased similarity threshold
+def build_fuzzy_index(dictionary, matcher=FUZZY_MATCHER):
+    if matcher == 'symspell':
+        return SymSpellIndex(dictionary)
+    return None
+
+def compiled_dictionary_is_current():
+    if not os.path.exists(COMPILED_DICTIONARY_PATH):
+        return False
+    if os.path.getmtime(COMPILED_DICTIONARY_PATH) < os.path.getmtime(DICTIONARY_PATH):
+        print("Compiled dictionary is older than the word list, using the text file")
+        return False
+    return True
+
+def load_lexicon(matcher=FUZZY_MATCHER):
+    # Returns (dictionary, fuzzy_index, segmenter). The compiled artifact is
+    # memory-mapped, so this is nearly free and worker processes share its pages;
+    # without it the structures are built from the text file (slow, once per process)
+    global _lexicon
+    if _lexicon is None or _lexicon[0] != matcher:
+        if compiled_dictionary_is_current():
+            dictionary = CompiledDictionary(COMPILED_DICTIONARY_PATH)
+            fuzzy_index = dictionary.fuzzy_index() if matcher == 'symspell' else None
+            segmenter = dictionary.segmenter(SEGMENT_CONNECTORS)
+        else:
+            dictionary = load_portuguese_dictionary()
+            fuzzy_index = build_fuzzy_index(dictionary, matcher)
+            segmenter = SortedWordTrie(dictionary, SEGMENT_CONNECTORS)
+        _lexicon = (matcher, dictionary, fuzzy_index, segmenter)
+    return _lexicon[1:]
+
+def find_similar_words(word, dictionary, cutoff=CORRECTION_CUTOFF, fuzzy_index=None):
+    if fuzzy_index is not None:
+        return fuzzy_index.close_matches(word, n=1, cutoff=cutoff)
     return get_close_matches(word, dictionary, n=1, cutoff=cutoff)
 
-def split_compound_words(word, dictionary):
+def compare_fuzzy_matchers(text, dictionary, fuzzy_index, cutoff=CORRECTION_CUTOFF):
+    # Returns (word, difflib_match, index_match) for every unknown token of text
+    # where the two matchers disagree
+    differences = []
+    for word in set(re.findall(r'\b[a-záàâãéêíóôõúüç]+\b', text.lower())):
+        if len(word) < CLEAN_MIN_WORD_LENGTH or word in dictionary:
+            continue
+        expected = get_close_matches(word, dictionary, n=1, cutoff=cutoff)
+        found = fuzzy_index.close_matches(word, n=1, cutoff=cutoff)
+        if expected != found:
+            differences.append((word, expected, found))
+    return differences
+
+def split_compound_words(word, dictionary, segmenter=None):
+    if segmenter is not None:
+        return segmenter.segment(word.lower(), SEGMENT_MIN_WORD_LENGTH)
+    
     words = []
     current = ""
     for char in word.lower():
@@ -41,7 +226,23 @@ def split_compound_words(word, dictionary):
     
     return words if words else []
 
-def clean_text(text, dictionary):
+def correct_word(word, dictionary, fuzzy_index=None, segmenter=None):
+    # Check for exact matches
+    if word in dictionary:
+        return [word]
+    
+    # Try to find similar words; a long word with a typo is corrected here
+    # instead of being cut into fragments
+    similar = find_similar_words(word, dictionary, fuzzy_index=fuzzy_index)[:1]
+    if similar:
+        return similar
+    
+    # Try to split compound words
+    if len(word) >= SPLIT_MIN_TOKEN_LENGTH:
+        return split_compound_words(word, dictionary, segmenter)
+    return []
+
+def clean_text(text, dictionary, fuzzy_index=None, segmenter=None, memo=None):
     # Convert to lowercase
     text = text.lower()
     
@@ -51,92 +252,747 @@ def clean_text(text, dictionary):
     valid_words = []
     for word in words:
         # Skip short words
-        if len(word) <= 2:
+        if len(word) < CLEAN_MIN_WORD_LENGTH:
             continue
         
-        # Try to split compound words
-        if len(word) > 12:
-            split_words = split_compound_words(word, dictionary)
-            if split_words:
-                valid_words.extend(split_words)
-                continue
-        
-        # Check for exact matches
-        if word in dictionary:
-            valid_words.append(word)
+        if memo is None:
+            valid_words.extend(correct_word(word, dictionary, fuzzy_index, segmenter))
             continue
         
-        # Try to find similar words
-        similar = find_similar_words(word, dictionary)
-        if similar:
-            valid_words.append(similar[0])
+        corrected = memo.get(word)
+        if corrected is None:
+            corrected = correct_word(word, dictionary, fuzzy_index, segmenter)
+            memo.put(word, corrected)
+        valid_words.extend(corrected)
     
     return ' '.join(valid_words)
 
-def extract_text_from_pdf(pdf_path):
-    dictionary = load_portuguese_dictionary()
-    pages = convert_from_path(pdf_path, dpi=300)
+def correction_signature(matcher=FUZZY_MATCHER):
+    # Every setting that changes how a token is corrected
+    _, fuzzy_index, segmenter = load_lexicon(matcher)
+    settings = {
+        "matcher": matcher,
+        "cutoff": CORRECTION_CUTOFF,
+        "min_length": CLEAN_MIN_WORD_LENGTH,
+        "split_length": SPLIT_MIN_TOKEN_LENGTH,
+        "segment_min_length": SEGMENT_MIN_WORD_LENGTH,
+        "connectors": ','.join(segmenter.connectors),
+        "dictionary": DICTIONARY_PATH
+    }
+    if fuzzy_index is not None:
+        settings["max_edit_distance"] = fuzzy_index.max_edit_distance
+        settings["prefix_length"] = fuzzy_index.prefix_length
+    return ';'.join(f"{key}={value}" for key, value in settings.items())
+
+def load_correction_memo(matcher=FUZZY_MATCHER):
+    # One memo per process; a saved memo is only reused with the same cleaning settings
+    global _correction_memo
+    signature = correction_signature(matcher)
+    if _correction_memo is None or _correction_memo.signature != signature:
+        if CORRECTION_MEMO_PATH:
+            _correction_memo = CorrectionMemo.load(CORRECTION_MEMO_PATH, CORRECTION_MEMO_SIZE, signature)
+        else:
+            _correction_memo = CorrectionMemo(CORRECTION_MEMO_SIZE, signature)
+    return _correction_memo
+
+def save_correction_memo():
+    if _correction_memo is not None and CORRECTION_MEMO_PATH:
+        _correction_memo.save(CORRECTION_MEMO_PATH)
+
+def engine_version(backend):
+    if backend.name not in _engine_versions:
+        _engine_versions[backend.name] = backend.version()
+    return _engine_versions[backend.name]
+
+def ocr_page_data(page, lang=OCR_LANG, backend=OCR_BACKEND):
+    # Returns the text (one line per Tesseract line), the mean confidence of the
+    # recognized words and the words themselves with their pixel boxes
+    lines = {}
+    confidences = []
+    words = get_ocr_backend(backend, lang).image_to_words(page)
+    for word in words:
+        if word["conf"] >= 0:
+            confidences.append(word["conf"])
+        lines.setdefault(word["line"], []).append(word["text"])
+    text = '\n'.join(' '.join(line) for line in lines.values())
+    return text, (sum(confidences) / len(confidences) if confidences else 0.0), words
+
+def ocr_page(page, lang=OCR_LANG, dpi=OCR_DPI, cache=None, backend=OCR_BACKEND):
+    # Returns (text, mean word confidence, word boxes in PDF points)
+    def run_ocr():
+        text, confidence, words = ocr_page_data(page, lang, backend)
+        return text, confidence, pack_ocr_words(words, dpi)
     
+    if cache is None:
+        return run_ocr()
+    
+    engine = engine_version(get_ocr_backend(backend, lang))
+    key = cache.key(page, dpi=dpi, lang=lang, engine=engine, words=True)
+    cached = cache.get(key)
+    if cached is not None:
+        cached = json.loads(cached)
+        return cached["text"], cached["confidence"], cached["words"]
+    text, confidence, words = run_ocr()
+    cache.put(key, json.dumps({"text": text, "confidence": confidence, "words": words}, ensure_ascii=False))
+    return text, confidence, words
+
+def read_page(task, cache=None, backend=OCR_BACKEND):
+    # Raw text and word boxes of a page: OCR for rendered pages, the text layer otherwise
+    page_number, source, payload, dpi = task
+    result = {"page_number": page_number, "source": source, "raw_text": payload, "words": []}
+    if source == "text":
+        result["raw_text"], result["words"] = payload
+    elif source == "ocr":
+        result["raw_text"], confidence, result["words"] = ocr_page(payload, dpi=dpi, cache=cache, backend=backend)
+        result["dpi"] = dpi
+        result["confidence"] = round(confidence, 1)
+    return result
+
+def init_ocr_worker(cache_dir=None, backend=OCR_BACKEND):
+    global _worker_cache
+    _worker_cache = OCRCache(cache_dir) if cache_dir else None
+    # Load the engine (and its language model) once, before the first page arrives
+    get_ocr_backend(backend, OCR_LANG)
+
+def read_page_worker(task, backend=OCR_BACKEND):
+    return read_page(task, _worker_cache, backend)
+
+def image_coverage(page):
+    # Fraction of the page area under its images
+    page_area = page.rect.get_area()
+    covered = sum((rect & page.rect).get_area() for xref, *_ in page.get_images()
+                  for rect in page.get_image_rects(xref))
+    return min(covered / page_area, 1.0) if page_area else 0.0
+
+def text_span(page, words):
+    # Fraction of the page area inside the bounding box of its text-layer words
+    page_area = page.rect.get_area()
+    if not words or not page_area:
+        return 0.0
+    span = fitz.Rect(words[0][1:5])
+    for word in words[1:]:
+        span |= fitz.Rect(word[1:5])
+    return (span & page.rect).get_area() / page_area
+
+def text_layer_rule(page, text, words):
+    # Why the page's text layer is used ('text_layer') or the page is OCR'd
+    # instead; kept with the page so the thresholds can be tuned
+    chars = [c for c in text if not c.isspace()]
+    if len(chars) < TEXT_LAYER_MIN_CHARS:
+        return 'too_short'
+    letters = sum(1 for c in chars if c.isalpha())
+    if letters / len(chars) < TEXT_LAYER_MIN_LETTER_RATIO:
+        return 'few_letters'
+    if (image_coverage(page) >= TEXT_LAYER_SCAN_IMAGE_COVERAGE
+            and text_span(page, words) < TEXT_LAYER_SCAN_MIN_SPAN):
+        return 'scan_sparse_text'
+    return 'text_layer'
+
+def read_text_layers(pdf_path):
+    # Returns the total page count, the native text and words of every
+    # born-digital page and the text_layer_rule of every page
+    text_pages = {}
+    rules = {}
+    with fitz.open(pdf_path) as doc:
+        total_pages = len(doc)
+        for i, page in enumerate(doc):
+            text = page.get_text()
+            words = pack_text_layer_words(page)
+            rules[i + 1] = text_layer_rule(page, text, words)
+            if rules[i + 1] == 'text_layer':
+                text_pages[i + 1] = (text, words)
+    return total_pages, text_pages, rules
+
+def page_jobs(total_pages, text_pages, window=RENDER_WINDOW, done_pages=()):
+    # Work items of the rasterize stage: text-layer pages pass straight through,
+    # the others are rendered in runs of up to `window` consecutive pages.
+    # Pages already finished by an earlier run are left out.
+    jobs = []
+    for page_number in range(1, total_pages + 1):
+        if page_number in done_pages:
+            continue
+        if page_number in text_pages:
+            jobs.append(("text", [page_number]))
+        elif (jobs and jobs[-1][0] == "render" and jobs[-1][1][-1] == page_number - 1
+              and len(jobs[-1][1]) < window):
+            jobs[-1][1].append(page_number)
+        else:
+            jobs.append(("render", [page_number]))
+    return jobs
+
+def render_pages(pdf_path, page_numbers, dpi=OCR_DPI, backend=RENDER_BACKEND, grayscale=IMAGE_GRAYSCALE):
+    if backend == 'pymupdf':
+        return list(render_pages_pymupdf(pdf_path, page_numbers, dpi, grayscale))
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=page_numbers[0], last_page=page_numbers[-1],
+                               grayscale=grayscale)
+    return zip(page_numbers, images)
+
+def render_pages_pymupdf(pdf_path, page_numbers, dpi=OCR_DPI, grayscale=IMAGE_GRAYSCALE):
+    colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+    mode = "L" if grayscale else "RGB"
+    with fitz.open(pdf_path) as doc:
+        for page_number in page_numbers:
+            pix = doc[page_number - 1].get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False)
+            yield page_number, Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+
+def otsu_threshold(pixels):
+    # Gray level that best separates ink from paper (maximum between-class variance)
+    # PIL counts in C; np.bincount would first copy the page into int64
+    histogram = np.array(Image.fromarray(pixels).histogram(), dtype=np.float64)
+    levels = np.arange(256)
+    weight_paper = np.cumsum(histogram)
+    weight_ink = pixels.size - weight_paper
+    cumulative = np.cumsum(histogram * levels)
+    mean_below = cumulative / np.maximum(weight_paper, 1)
+    mean_above = (cumulative[-1] - cumulative) / np.maximum(weight_ink, 1)
+    return int(np.argmax(weight_paper * weight_ink * (mean_below - mean_above) ** 2))
+
+def binarize(pixels):
+    # uint8 scalars keep the result at one byte per pixel (plain 255/0 would
+    # build an int64 page first)
+    return np.where(pixels > otsu_threshold(pixels), np.uint8(255), np.uint8(0))
+
+def estimate_skew(pixels):
+    # Text lines give the sharpest horizontal projection profile when level;
+    # try every candidate angle on a reduced copy with ink as bright pixels
+    small = Image.fromarray(255 - pixels).reduce(4)
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_ANGLE_STEP / 2, DESKEW_ANGLE_STEP):
+        profile = np.asarray(small.rotate(float(angle), resample=Image.NEAREST), dtype=np.float32).sum(axis=1)
+        score = float(np.sum(np.diff(profile) ** 2))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+def deskew(pixels):
+    # Returns the straightened pixels and the angle they were rotated by
+    angle = estimate_skew(pixels)
+    if abs(angle) < DESKEW_ANGLE_STEP / 2:
+        return pixels, 0.0
+    rotated = Image.fromarray(pixels).rotate(angle, resample=Image.NEAREST, fillcolor=255)
+    return np.asarray(rotated), angle
+
+def despeckle(pixels, min_neighbours=DESPECKLE_MIN_NEIGHBOURS):
+    # Turns ink pixels with fewer than min_neighbours ink pixels around them into paper
+    ink = pixels < 128
+    padded = np.pad(ink, 1).astype(np.uint8)
+    height, width = ink.shape
+    neighbours = np.zeros(ink.shape, dtype=np.uint8)
+    for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+            if dy != 1 or dx != 1:
+                neighbours += padded[dy:dy + height, dx:dx + width]
+    cleaned = pixels.copy()
+    cleaned[ink & (neighbours < min_neighbours)] = 255
+    return cleaned
+
+IMAGE_PREP_FUNCTIONS = {
+    'threshold': binarize,
+    'deskew': deskew,
+    'despeckle': despeckle
+}
+
+def prepare_page_image(image, steps=PREPARE_STEPS):
+    pixels = np.asarray(image.convert('L'))
+    deskew_angle = 0.0
+    for step in steps:
+        started = time.perf_counter()
+        pixels = IMAGE_PREP_FUNCTIONS[step](pixels)
+        if step == 'deskew':
+            pixels, deskew_angle = pixels
+        elapsed = time.perf_counter() - started
+        with _ocr_counters_lock:
+            timing = image_prep_timings.setdefault(step, [0, 0.0])
+            timing[0] += 1
+            timing[1] += elapsed
+    prepared = Image.fromarray(pixels)
+    # OCR boxes are measured on the straightened image; page_image_words undoes it
+    prepared.info["deskew_angle"] = deskew_angle
+    return prepared
+
+def page_image_words(result, image, derotation=None):
+    # Moves the OCR word boxes of `result` from the page image to page space
+    scale = 72.0 / result["dpi"]
+    result["words"] = page_space_words(result["words"], (image.width * scale, image.height * scale),
+                                       image.info.get("deskew_angle", 0.0), derotation)
+    return result
+
+def page_ink_stats(image):
+    # Returns (ink ratio, standard deviation) of the page without its margins,
+    # measured on a copy reduced BLANK_DOWNSAMPLE times in each direction
+    small = image.reduce(BLANK_DOWNSAMPLE).convert('L')
+    pixels = np.asarray(small, dtype=np.float32)
+    height, width = pixels.shape
+    dy, dx = int(height * BLANK_MARGIN), int(width * BLANK_MARGIN)
+    pixels = pixels[dy:height - dy, dx:width - dx]
+    if pixels.size == 0:
+        return 0.0, 0.0
+    paper = np.median(pixels)
+    ink_ratio = float(np.count_nonzero(pixels < paper - BLANK_INK_CONTRAST)) / pixels.size
+    return ink_ratio, float(pixels.std())
+
+def is_blank_page(image):
+    ink_ratio, std = page_ink_stats(image)
+    return ink_ratio < BLANK_MAX_INK_RATIO or std < BLANK_MIN_STD
+
+def in_page_order(document, result):
+    # Stages finish pages out of order; hold a document's results back until their turn
+    document["pending"][result["page_number"]] = result
+    ready = []
+    while document["next_page"] in document["pending"]:
+        ready.append(document["pending"].pop(document["next_page"]))
+        document["next_page"] = next(document["order"], None)
+    return ready
+
+def count_pages(pdf_path):
+    try:
+        with fitz.open(pdf_path) as doc:
+            return len(doc)
+    except Exception:
+        return 0
+
+def open_document(pdf_path, text_layer=True, window=RENDER_WINDOW, journal_path=None, settings=None):
+    # Per-document state of an ingestion run
+    if text_layer:
+        total_pages, text_pages, text_layer_rules = read_text_layers(pdf_path)
+    else:
+        total_pages = count_pages(pdf_path)
+        text_pages = {}
+        text_layer_rules = {}
+    
+    # Every finished page goes to the journal right away; the pages an earlier,
+    # interrupted run already finished are taken from it instead of redone
+    journal = None
+    finished = {}
+    if journal_path:
+        journal = PageJournal(journal_path, pdf_path, settings)
+        finished = journal.pages
+    jobs = page_jobs(total_pages, text_pages, window, done_pages=finished)
+    remaining = [page_number for _, page_numbers in jobs for page_number in page_numbers]
+    order = iter(remaining)
+    return {
+        "pdf_path": pdf_path,
+        "extraction_date": datetime.now().isoformat(),
+        "total_pages": total_pages,
+        "text_pages": text_pages,
+        "text_layer_rules": text_layer_rules,
+        "derotations": page_derotations(pdf_path),
+        "jobs": jobs,
+        "journal": journal,
+        "finished": finished,
+        "resumed_pages": len(finished),
+        "pages_left": len(remaining),
+        "pending": {},
+        "order": order,
+        "next_page": next(order, None),
+        "blank": set(),
+        "error": None,
+        "closed": False
+    }
+
+def has_text(page_data):
+    # Pages whose cleaned text is empty are still kept while they have raw text,
+    # a later re-clean may recover words from it
+    return bool(page_data["content"].strip() or page_data.get("raw_text", "").strip())
+
+def finish_document(document):
+    if document["journal"] is not None:
+        document["journal"].close()
+    finished = document["finished"]
     pdf_data = {
         "document_info": {
-            "filename": os.path.basename(pdf_path),
-            "path": pdf_path,
-            "extraction_date": datetime.now().isoformat(),
-            "total_pages": len(pages)
+            "filename": os.path.basename(document["pdf_path"]),
+            "path": document["pdf_path"],
+            "extraction_date": document["extraction_date"],
+            "total_pages": document["total_pages"],
+            "blank_pages": sorted(n for n in finished if finished[n].get("blank"))
         },
-        "pages": []
+        "pages": [finished[n] for n in sorted(finished) if has_text(finished[n])]
     }
+    if document["resumed_pages"]:
+        pdf_data["document_info"]["resumed_pages"] = document["resumed_pages"]
+    return pdf_data
+
+def ingest_documents(pdf_paths, urgent=(), workers=1, window=RENDER_WINDOW, text_layer=True, cache_dir=OCR_CACHE_DIR,
+                     matcher=FUZZY_MATCHER, raster_workers=RASTER_WORKERS, clean_workers=CLEAN_WORKERS,
+                     queue_size=PIPELINE_QUEUE_SIZE, blank_pages=BLANK_PAGE_MODE, render_backend=RENDER_BACKEND,
+                     prepare_steps=PREPARE_STEPS, adaptive_dpi=ADAPTIVE_DPI, ocr_backend=OCR_BACKEND,
+                     journals=None, scheduler=None, on_document=None, on_page=None, stats=None):
+    # Extracts a batch of PDFs through one shared pipeline. The scheduler hands
+    # out work page by page across all documents; on_document(pdf_path, pdf_data,
+    # error) is called as soon as each document is complete (or has failed).
+    settings = ingestion_settings(text_layer, matcher, render_backend, ocr_backend, adaptive_dpi, blank_pages,
+                                  prepare_steps)
+    journals = journals or {}
+    scheduler = scheduler or PageScheduler()
+    documents = {}
+    ocr_time = {"pages": 0, "seconds": 0.0, "escalated": 0, "blank": 0}
+    render_dpi = ADAPTIVE_LOW_DPI if adaptive_dpi else OCR_DPI
     
-    for i, page in enumerate(pages):
-        raw_text = pytesseract.image_to_string(page, lang='por')
-        cleaned_text = clean_text(raw_text, dictionary)
-        
-        if cleaned_text.strip():
-            page_data = {
-                "page_number": i + 1,
-                "content": cleaned_text,
-                "word_count": len(cleaned_text.split())
-            }
-            pdf_data["pages"].append(page_data)
+    def load_jobs(pdf_path):
+        def load():
+            try:
+                document = open_document(pdf_path, text_layer, window, journals.get(pdf_path), settings)
+            except Exception as e:
+                documents[pdf_path] = {"pdf_path": pdf_path, "error": e, "closed": False}
+                return []
+            documents[pdf_path] = document
+            return document.pop("jobs")
+        return load
     
-    return pdf_data
+    for pdf_path in pdf_paths:
+        scheduler.add(pdf_path, count_pages(pdf_path), load_jobs(pdf_path), urgent=pdf_path in urgent)
+    
+    # Cleaning runs in the calling process, so every page of every document in
+    # the run shares one correction memo
+    dictionary, fuzzy_index, segmenter = load_lexicon(matcher)
+    memo = load_correction_memo(matcher)
+    cache = OCRCache(cache_dir) if cache_dir else None
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_ocr_worker,
+                                       initargs=(cache_dir, ocr_backend))
+    
+    # Stages: rasterize -> OCR -> clean, each with its own workers; the calling
+    # thread persists pages in order while the stages keep working. Items are
+    # (document, payload); a failed document is passed on as (document, None).
+    def per_document(handler):
+        def run(item, emit):
+            document, payload = item
+            if document["error"] is not None or payload is None:
+                emit((document, None))
+                return
+            try:
+                handler(document, payload, lambda result: emit((document, result)))
+            except Exception as e:
+                document["error"] = e
+                scheduler.cancel(document["pdf_path"])
+                emit((document, None))
+        return run
+    
+    def render_prepared(pdf_path, page_numbers, dpi):
+        for page_number, image in render_pages(pdf_path, page_numbers, dpi=dpi, backend=render_backend):
+            if prepare_steps:
+                image = prepare_page_image(image, prepare_steps)
+            yield page_number, image
+    
+    def rasterize(document, job, emit):
+        kind, page_numbers = job
+        if kind == "text":
+            emit((page_numbers[0], "text", document["text_pages"][page_numbers[0]], None))
+            return
+        for page_number, image in render_pages(document["pdf_path"], page_numbers, dpi=render_dpi,
+                                               backend=render_backend):
+            if blank_pages and is_blank_page(image):
+                document["blank"].add(page_number)
+                if blank_pages == 'skip':
+                    emit((page_number, "blank", "", None))
+                    continue
+            if prepare_steps:
+                image = prepare_page_image(image, prepare_steps)
+            emit((page_number, "ocr", image, render_dpi))
+    
+    def run_ocr(task):
+        started = time.perf_counter()
+        if executor is not None:
+            result = executor.submit(read_page_worker, task, ocr_backend).result()
+        else:
+            result = read_page(task, cache, ocr_backend)
+        with _ocr_counters_lock:
+            ocr_time["pages"] += 1
+            ocr_time["seconds"] += time.perf_counter() - started
+        return result
+    
+    def ocr(document, task, emit):
+        if task[1] != "ocr":
+            emit(read_page(task))
+            return
+        result = run_ocr(task)
+        if adaptive_dpi and task[3] < OCR_DPI and result["confidence"] < ADAPTIVE_MIN_CONFIDENCE:
+            # Low confidence at the fast resolution: render this page again at full resolution
+            for page_number, image in render_prepared(document["pdf_path"], [task[0]], OCR_DPI):
+                task = (page_number, "ocr", image, OCR_DPI)
+                result = run_ocr(task)
+            with _ocr_counters_lock:
+                ocr_time["escalated"] += 1
+        emit(page_image_words(result, task[2], document["derotations"].get(task[0])))
+    
+    def clean(document, result, emit):
+        result["content"] = clean_text(result["raw_text"], dictionary, fuzzy_index, segmenter, memo)
+        # Process numbers, CPFs and dates do not survive cleaning; take them from the raw text
+        result["entities"] = extract_entities(result["raw_text"])
+        emit(result)
+    
+    def persist(document, result):
+        page_number, cleaned_text = result["page_number"], result["content"]
+        # Pages without text are journaled too, so a resumed run skips them; the raw
+        # text is kept so cleaning can be redone later without OCR (reclean.py)
+        page_data = {
+            "page_number": page_number,
+            "content": cleaned_text,
+            "raw_text": result["raw_text"],
+            "word_count": len(cleaned_text.split()),
+            "source": result["source"]
+        }
+        for key in ("dpi", "confidence"):
+            if key in result:
+                page_data[key] = result[key]
+        if page_number in document["text_layer_rules"]:
+            page_data["text_layer_rule"] = document["text_layer_rules"][page_number]
+        if page_number in document["blank"]:
+            page_data["blank"] = True
+        if result["entities"]:
+            page_data["entities"] = result["entities"]
+        if result["words"]:
+            page_data["words"] = result["words"]
+        if document["journal"] is not None:
+            document["journal"].append(page_data)
+        else:
+            document["finished"][page_number] = page_data
+        document["pages_left"] -= 1
+        scheduler.page_done(document["pdf_path"])
+        if on_page is not None and cleaned_text.strip():
+            on_page(document["pdf_path"], page_data)
+    
+    def close(document):
+        document["closed"] = True
+        scheduler.document_done(document["pdf_path"])
+        documents.pop(document["pdf_path"], None)
+        pdf_data = None
+        if document["error"] is None:
+            pdf_data = finish_document(document)
+            ocr_time["blank"] += len(document["blank"])
+        elif document.get("journal") is not None:
+            document["journal"].close()
+        if on_document is not None:
+            on_document(document["pdf_path"], pdf_data, document["error"])
+    
+    def feed():
+        for pdf_path, job in scheduler:
+            yield documents[pdf_path], job
+    
+    pipeline = Pipeline(queue_size)
+    pipeline.add_stage("rasterize", per_document(rasterize), raster_workers)
+    pipeline.add_stage("ocr", per_document(ocr), workers)
+    pipeline.add_stage("clean", per_document(clean), clean_workers)
+    
+    try:
+        for document, result in pipeline.run(feed()):
+            if document["closed"]:
+                continue
+            if document["error"] is None and result is not None:
+                for ready in in_page_order(document, result):
+                    persist(document, ready)
+            if document["error"] is not None or document["pages_left"] == 0:
+                close(document)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        for document in list(documents.values()):
+            if document.get("journal") is not None:
+                document["journal"].close()
+    
+    # Skipped blank pages are estimated to have cost the mean OCR time of the run
+    with _ocr_counters_lock:
+        ocr_counters["ocr_pages"] += ocr_time["pages"]
+        ocr_counters["ocr_seconds"] += ocr_time["seconds"]
+        if blank_pages == 'skip' and ocr_counters["ocr_pages"]:
+            mean_ocr_seconds = ocr_counters["ocr_seconds"] / ocr_counters["ocr_pages"]
+            ocr_counters["blank_pages"] += ocr_time["blank"]
+            ocr_counters["ocr_seconds_saved"] += ocr_time["blank"] * mean_ocr_seconds
+    
+    if stats is not None:
+        stats.update(pipeline.stats)
+        stats["blank_pages"] = ocr_time["blank"]
+        stats["escalated_pages"] = ocr_time["escalated"]
+        with _ocr_counters_lock:
+            stats["image_prep"] = {step: list(timing) for step, timing in image_prep_timings.items()}
+
+def extract_text_from_pdf(pdf_path, workers=1, window=RENDER_WINDOW, text_layer=True, cache_dir=OCR_CACHE_DIR,
+                          matcher=FUZZY_MATCHER, raster_workers=RASTER_WORKERS, clean_workers=CLEAN_WORKERS,
+                          queue_size=PIPELINE_QUEUE_SIZE, blank_pages=BLANK_PAGE_MODE, render_backend=RENDER_BACKEND,
+                          prepare_steps=PREPARE_STEPS, adaptive_dpi=ADAPTIVE_DPI, ocr_backend=OCR_BACKEND,
+                          journal_path=None, on_page=None, stats=None):
+    # A batch of one
+    outcome = {}
+    
+    def on_document(path, pdf_data, error):
+        outcome["pdf_data"], outcome["error"] = pdf_data, error
+    
+    ingest_documents([pdf_path], workers=workers, window=window, text_layer=text_layer, cache_dir=cache_dir,
+                     matcher=matcher, raster_workers=raster_workers, clean_workers=clean_workers,
+                     queue_size=queue_size, blank_pages=blank_pages, render_backend=render_backend,
+                     prepare_steps=prepare_steps, adaptive_dpi=adaptive_dpi, ocr_backend=ocr_backend,
+                     journals={pdf_path: journal_path} if journal_path else None, on_document=on_document,
+                     on_page=(lambda path, page_data: on_page(page_data)) if on_page else None, stats=stats)
+    if outcome["error"] is not None:
+        raise outcome["error"]
+    return outcome["pdf_data"]
+
+def ingestion_settings(text_layer=True, matcher=FUZZY_MATCHER, render_backend=RENDER_BACKEND, ocr_backend=OCR_BACKEND,
+                       adaptive_dpi=ADAPTIVE_DPI, blank_pages=BLANK_PAGE_MODE, prepare_steps=PREPARE_STEPS):
+    # Everything that changes the extracted text; stored in the manifest and the
+    # page journals so a settings change reprocesses the affected PDFs. Callers
+    # overriding a setting must pass it here too.
+    return {
+        "dpi": OCR_DPI,
+        "adaptive_dpi": [ADAPTIVE_LOW_DPI, ADAPTIVE_MIN_CONFIDENCE] if adaptive_dpi else None,
+        "lang": OCR_LANG,
+        "ocr_backend": ocr_backend,
+        "render_backend": render_backend,
+        "grayscale": IMAGE_GRAYSCALE,
+        "prepare_steps": list(prepare_steps or ()),
+        "text_layer": text_layer,
+        "text_layer_min_chars": TEXT_LAYER_MIN_CHARS,
+        "text_layer_min_letter_ratio": TEXT_LAYER_MIN_LETTER_RATIO,
+        "text_layer_scan": [TEXT_LAYER_SCAN_IMAGE_COVERAGE, TEXT_LAYER_SCAN_MIN_SPAN],
+        "matcher": matcher,
+        "blank_pages": blank_pages,
+        "segmenter": "trie"
+    }
 
-def save_to_json(data, base_name):
-    json_path = f"{base_name}.json"
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+def save_to_json(data, base_name, compression=OUTPUT_COMPRESSION):
+    f, json_path = open_output(f"{base_name}.json", compression)
+    # The document info stays indented; each page is written compactly on one
+    # line, so its [text, x0, y0, x1, y1] word boxes do not take 7 lines each
+    with f:
+        f.write('{\n    "document_info": ')
+        f.write(json.dumps(data['document_info'], ensure_ascii=False, indent=4).replace('\n', '\n    '))
+        f.write(',\n    "pages": [')
+        for i, page in enumerate(data['pages']):
+            f.write(',\n        ' if i else '\n        ')
+            f.write(json.dumps(page, ensure_ascii=False, separators=(',', ':')))
+        f.write('\n    ]\n}\n' if data['pages'] else ']\n}\n')
     return json_path
 
-def save_to_txt(data, base_name):
-    txt_path = f"{base_name}.txt"
-    with open(txt_path, 'w', encoding='utf-8') as f:
+def save_to_jsonl(data, base_name):
+    writer = JsonlPageWriter(base_name)
+    for page in data['pages']:
+        writer.write_page(page)
+    return writer.close(data['document_info'])
+
+def save_to_searchable_pdf(data, base_name):
+    # Path of the searchable copy, or None when the document has no OCR pages
+    pdf_path = data['document_info']['path']
+    return write_searchable_pdf(pdf_path, data['pages'], sidecar_path(pdf_path))
+
+def save_to_txt(data, base_name, compression=OUTPUT_COMPRESSION):
+    f, txt_path = open_output(f"{base_name}.txt", compression)
+    with f:
         f.write(f"Document: {data['document_info']['filename']}\n")
         f.write(f"Extraction Date: {data['document_info']['extraction_date']}\n")
         f.write("-" * 80 + "\n\n")
         
         for page in data['pages']:
+            if not page['content'].strip():
+                continue
             f.write(f"Page {page['page_number']}\n")
             f.write("-" * 40 + "\n")
             f.write(page['content'])
             f.write("\n\n")
     return txt_path
 
+def stream_jsonl_page(jsonl_writers, pdf_path, page_data):
+    # on_page helper: appends the page to the document's JSONL as soon as it is done
+    if EXPORT_JSONL:
+        if pdf_path not in jsonl_writers:
+            jsonl_writers[pdf_path] = JsonlPageWriter(os.path.splitext(pdf_path)[0])
+        jsonl_writers[pdf_path].write_page(page_data)
+
+def save_document(pdf_path, pdf_data, error, store, manifest, entity_index, settings, jsonl_writer=None):
+    # on_document helper shared by the batch run and the GUI: stores a finished
+    # document, writes its exports, records it in the manifest and the entity
+    # index and drops its journal. Returns the outputs written. A failed document
+    # (or a failure here) discards the unfinished JSONL and raises.
+    base_name = os.path.splitext(pdf_path)[0]
+    try:
+        if error is not None:
+            raise error
+        store.save_document(pdf_data, settings)
+        outputs = [store.path]
+        if EXPORT_JSON_TXT:
+            outputs += [save_to_txt(pdf_data, base_name), save_to_json(pdf_data, base_name)]
+        if EXPORT_JSONL:
+            jsonl_writer = jsonl_writer or JsonlPageWriter(base_name)
+            jsonl_writer.write_missing(pdf_data['pages'])
+            outputs.append(jsonl_writer.close(pdf_data['document_info']))
+        # Searchable copy of the PDF; the signed original is never modified
+        if SEARCHABLE_PDF:
+            sidecar = save_to_searchable_pdf(pdf_data, base_name)
+            if sidecar is not None:
+                outputs.append(sidecar)
+        manifest.record(pdf_path, settings, outputs)
+        manifest.save()
+        entity_index.add_document(os.path.basename(pdf_path), pdf_data["pages"])
+        entity_index.save()
+    except Exception:
+        if jsonl_writer is not None:
+            jsonl_writer.abort()
+        raise
+    # The outputs are complete, the journal is no longer needed
+    remove_journal(journal_path_for(base_name))
+    return outputs
+
 if __name__ == "__main__":
     pdf_directory = "c:\\Dev\\Whoosh\\pdf"
+    # PDF names given on the command line are processed before the rest
+    requested = {os.path.join(pdf_directory, os.path.basename(name)) for name in sys.argv[1:]}
+    manifest = IngestionManifest(pdf_directory)
+    entity_index = EntityIndex(pdf_directory)
+    store = CorpusStore(corpus_path(pdf_directory))
+    settings = ingestion_settings()
+    skipped = []
+    pending = []
     
     for pdf_file in os.listdir(pdf_directory):
-        if pdf_file.lower().endswith('.pdf'):
+        if pdf_file.lower().endswith('.pdf') and not is_sidecar(pdf_file):
             pdf_path = os.path.join(pdf_directory, pdf_file)
-            base_name = os.path.splitext(pdf_path)[0]
             
-            print(f"Processing: {pdf_file}")
-            try:
-                pdf_data = extract_text_from_pdf(pdf_path)
-                txt_file = save_to_txt(pdf_data, base_name)
-                json_file = save_to_json(pdf_data, base_name)
-                print(f"Created TXT: {txt_file}")
-                print(f"Created JSON: {json_file}")
-            except Exception as e:
-                print(f"Error processing {pdf_file}: {str(e)}")
+            needed, reason = manifest.needs_processing(pdf_path, settings)
+            if not needed:
+                skipped.append(pdf_file)
+                continue
+            print(f"Queued: {pdf_file} ({reason})")
+            pending.append(pdf_path)
+    
+    # JSONL outputs are written page by page while the documents are processed
+    jsonl_writers = {}
+    
+    def stream_page(pdf_path, page_data):
+        stream_jsonl_page(jsonl_writers, pdf_path, page_data)
+    
+    def on_document(pdf_path, pdf_data, error):
+        pdf_file = os.path.basename(pdf_path)
+        try:
+            outputs = save_document(pdf_path, pdf_data, error, store, manifest, entity_index, settings,
+                                    jsonl_writers.pop(pdf_path, None))
+        except Exception as e:
+            print(f"Error processing {pdf_file}: {str(e)}")
+            return
+        if pdf_data["document_info"].get("resumed_pages"):
+            print(f"Resumed {pdf_file}: {pdf_data['document_info']['resumed_pages']} page(s) taken from the journal")
+        for output in outputs:
+            print(f"Created: {output}")
+    
+    journals = {pdf_path: journal_path_for(os.path.splitext(pdf_path)[0]) for pdf_path in pending}
+    ingest_documents(pending, urgent=requested, workers=OCR_WORKERS, journals=journals, on_document=on_document,
+                     on_page=stream_page)
     
-    print("Processing completed!")
\ No newline at end of file
+    # Persist mtime refreshes of files that were skipped by content hash
+    manifest.save()
+    save_correction_memo()
+    if ocr_counters["blank_pages"]:
+        print(f"Blank pages skipped: {ocr_counters['blank_pages']} "
+              f"(~{ocr_counters['ocr_seconds_saved']:.0f}s of OCR saved)")
+    for step, (pages, seconds) in image_prep_timings.items():
+        print(f"Image preparation '{step}': {pages} pages, {seconds / pages * 1000:.0f} ms/page")
+    if _correction_memo is not None:
+        stats = _correction_memo.stats()
+        print(f"Correction memo: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%}), {stats['entries']} entries")
+    print(f"Skipped {len(skipped)} unchanged PDF(s)")
+    for pdf_file in skipped[:SKIPPED_REPORT_LIMIT]:
+        print(f"  {pdf_file}")
+    if len(skipped) > SKIPPED_REPORT_LIMIT:
+        print(f"  ... and {len(skipped) - SKIPPED_REPORT_LIMIT} more")
+    print("Processing completed!")
@@ -0,0 +1,112 @@
+import time
+import queue
+import threading
+
+# Chain of processing stages joined by bounded queues. Every stage runs on its
+# own worker threads, so different stages work on different pages at the same
+# time; a full queue blocks the stage feeding it, which keeps a fast producer
+# from running ahead of a slow consumer (backpressure).
+
+STAGE_DONE = object()
+
+class Pipeline:
+    def __init__(self, queue_size=4):
+        self.queue_size = queue_size
+        self.stages = []
+        self.stop = threading.Event()
+        self.errors = []
+        self.stats = {}
+
+    def add_stage(self, name, handler, workers=1):
+        # handler(item, emit) is called once per item and passes results on with emit()
+        self.stages.append((name, handler, max(1, workers)))
+        self.stats[name] = {'items': 0, 'busy_seconds': 0.0}
+
+    def _put(self, q, item):
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q):
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return STAGE_DONE
+
+    def _start_stage(self, name, handler, workers, inbox, outbox):
+        remaining = [workers]
+        lock = threading.Lock()
+        stats = self.stats[name]
+
+        def emit(result):
+            self._put(outbox, result)
+
+        def run():
+            try:
+                while True:
+                    item = self._get(inbox)
+                    if item is STAGE_DONE:
+                        # Let the sibling workers of this stage see the end as well
+                        self._put(inbox, STAGE_DONE)
+                        break
+                    started = time.perf_counter()
+                    handler(item, emit)
+                    with lock:
+                        stats['items'] += 1
+                        stats['busy_seconds'] += time.perf_counter() - started
+            except BaseException as e:
+                self.errors.append(e)
+                self.stop.set()
+            finally:
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    self._put(outbox, STAGE_DONE)
+
+        threads = [threading.Thread(target=run, name=f"{name}-{i}", daemon=True) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def run(self, items):
+        # Feeds items to the first stage and yields whatever the last stage emits,
+        # in completion order. Raises the first error raised by any stage.
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = []
+        for i, (name, handler, workers) in enumerate(self.stages):
+            threads += self._start_stage(name, handler, workers, queues[i], queues[i + 1])
+
+        def feed():
+            try:
+                for item in items:
+                    if self.stop.is_set():
+                        return
+                    self._put(queues[0], item)
+                self._put(queues[0], STAGE_DONE)
+            except BaseException as e:
+                self.errors.append(e)
+                self.stop.set()
+
+        feeder = threading.Thread(target=feed, name="feeder", daemon=True)
+        feeder.start()
+        result = None
+        try:
+            while True:
+                result = self._get(queues[-1])
+                if result is STAGE_DONE:
+                    break
+                yield result
+        finally:
+            # Stops the stages if the consumer gave up early or a stage failed
+            if result is not STAGE_DONE:
+                self.stop.set()
+            for thread in [feeder] + threads:
+                thread.join()
+        if self.errors:
+            raise self.errors[0]
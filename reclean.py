@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import time
+from datetime import datetime
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from pesquisav06 import (load_lexicon, load_correction_memo, clean_text, save_to_json,
+                         save_to_txt, save_to_jsonl, FUZZY_MATCHER, OCR_WORKERS, EXPORT_JSON_TXT, EXPORT_JSONL)
+from entity_index import EntityIndex, extract_entities
+from corpus_store import CorpusStore, corpus_path
+from compressed_io import open_text, strip_compression_suffix
+
+# Re-clean: rebuilds the cleaned text of every stored document from the raw OCR
+# text kept with its pages, then the JSON/JSONL/TXT exports, the search index
+# and the entity index. No page is rendered or OCR'd again, so a change to the
+# cleaning rules costs minutes, not days.
+# Usage: python reclean.py [pdf directory]
+
+RECLEAN_CHUNK_PAGES = 64
+# Documents loaded, cleaned and written back per transaction; memory use is
+# bounded by the batch, not by the size of the corpus
+RECLEAN_BATCH_DOCUMENTS = 16
+
+def init_clean_worker(matcher=FUZZY_MATCHER):
+    # Lexicon and correction memo once per worker, before the first chunk arrives
+    load_lexicon(matcher)
+    load_correction_memo(matcher)
+
+def clean_pages(raw_texts, matcher=FUZZY_MATCHER):
+    # (cleaned text, entities) of every raw text
+    dictionary, fuzzy_index, segmenter = load_lexicon(matcher)
+    memo = load_correction_memo(matcher)
+    return [(clean_text(raw_text, dictionary, fuzzy_index, segmenter, memo), extract_entities(raw_text))
+            for raw_text in raw_texts]
+
+def find_documents(pdf_directory, store=None):
+    # Yields (base_name, data, stored) for every document of the corpus database,
+    # then for the extraction JSONs of documents the database does not have yet;
+    # documents are loaded one at a time, as they are consumed
+    stored = set(store.filenames()) if store is not None else set()
+    for filename in sorted(stored):
+        yield os.path.splitext(os.path.join(pdf_directory, filename))[0], store.load_document(filename), True
+    for filename in sorted(os.listdir(pdf_directory)):
+        if not strip_compression_suffix(filename).endswith('.json'):
+            continue
+        json_path = os.path.join(pdf_directory, filename)
+        with open_text(json_path) as f:
+            data = json.load(f)
+        if isinstance(data, dict) and 'document_info' in data and data['document_info']['filename'] not in stored:
+            yield os.path.splitext(strip_compression_suffix(json_path))[0], data, False
+
+def reclean_documents(documents, executor, matcher=FUZZY_MATCHER):
+    # Cleans the pages of a batch of documents in chunks spread over the
+    # executor's worker processes and updates the page data in place; returns
+    # the documents whose pages all had raw text
+    chunks = []
+    cleaned = []
+    for base_name, data, stored in documents:
+        pages = data['pages']
+        if any('raw_text' not in page for page in pages):
+            print(f"No raw text stored, needs a new extraction: {data['document_info']['filename']}")
+            continue
+        cleaned.append((base_name, data, stored))
+        for start in range(0, len(pages), RECLEAN_CHUNK_PAGES):
+            chunks.append(pages[start:start + RECLEAN_CHUNK_PAGES])
+
+    futures = [executor.submit(clean_pages, [page['raw_text'] for page in chunk], matcher) for chunk in chunks]
+    for chunk, future in zip(chunks, futures):
+        for page, (content, entities) in zip(chunk, future.result()):
+            page['content'] = content
+            page['word_count'] = len(content.split())
+            page.pop('entities', None)
+            if entities:
+                page['entities'] = entities
+    return cleaned
+
+if __name__ == "__main__":
+    from pdf_search import update_index
+
+    pdf_directory = sys.argv[1] if len(sys.argv) > 1 else "c:\\Dev\\Whoosh\\pdf"
+    started = time.perf_counter()
+    store = CorpusStore(corpus_path(pdf_directory))
+    entity_index = EntityIndex(pdf_directory)
+    documents = find_documents(pdf_directory, store)
+    counts = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    total_documents = total_pages = 0
+
+    with ProcessPoolExecutor(max_workers=OCR_WORKERS, initializer=init_clean_worker,
+                             initargs=(FUZZY_MATCHER,)) as executor:
+        while True:
+            batch = list(islice(documents, RECLEAN_BATCH_DOCUMENTS))
+            if not batch:
+                break
+            cleaned = reclean_documents(batch, executor)
+
+            index_documents = []
+            for base_name, data, _ in cleaned:
+                data['document_info']['cleaning_date'] = datetime.now().isoformat()
+                if EXPORT_JSON_TXT:
+                    save_to_json(data, base_name)
+                    save_to_txt(data, base_name)
+                if EXPORT_JSONL:
+                    save_to_jsonl(data, base_name)
+                pdf_path = data['document_info'].get('path') or base_name + '.pdf'
+                index_documents.append((pdf_path, [(page['page_number'], page['content'])
+                                                   for page in data['pages'] if page['content'].strip()]))
+                entity_index.add_document(data['document_info']['filename'], data['pages'])
+                total_pages += len(data['pages'])
+                print(f"Re-cleaned: {data['document_info']['filename']} ({len(data['pages'])} pages)")
+            total_documents += len(cleaned)
+
+            # Per batch, stored pages only get their cleaned text and
+            # entities updated, documents found only as JSON are added to the database
+            store.update_cleaned_pages([data for _, data, stored in cleaned if stored])
+            store.save_documents([data for _, data, stored in cleaned if not stored])
+            # Only pages whose cleaned text actually changed are rewritten in the index;
+            # OCR_WORKERS is an upper bound, small updates use a single writer process
+            _, batch_counts = update_index(index_documents, procs=OCR_WORKERS)
+            for key, value in batch_counts.items():
+                counts[key] += value
+
+    print(f"Index: {counts['added']} added, {counts['updated']} updated, {counts['deleted']} deleted, "
+          f"{counts['unchanged']} unchanged")
+    entity_index.save()
+    store.close()
+    print(f"Re-cleaned {total_documents} document(s), {total_pages} pages in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,121 @@
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+
+# Page-level work queue shared by every PDF of a batch. Documents wait in a
+# priority heap (user-requested first, then smallest first) and up to
+# `max_active` of them are open at a time; the open ones are served round-robin,
+# one job per turn, so a long PDF never holds up the documents behind it.
+# User-requested documents are opened right away and served before the others.
+
+SCHEDULER_ACTIVE_DOCUMENTS = 4
+
+class PageScheduler:
+    def __init__(self, max_active=SCHEDULER_ACTIVE_DOCUMENTS):
+        self.max_active = max_active
+        self.lock = threading.Lock()
+        self.waiting = []
+        self.active = deque()
+        self.empty = deque()
+        self.urgent = set()
+        self.sequence = itertools.count()
+        self.pages_left = {}
+        self.pages_done = 0
+        self.started = None
+
+    def add(self, key, pages, load_jobs, urgent=False):
+        # load_jobs() is called when the document is opened and returns its jobs,
+        # each a (kind, page_numbers) tuple
+        with self.lock:
+            if urgent:
+                self.urgent.add(key)
+            self.pages_left[key] = pages
+            heapq.heappush(self.waiting, (not urgent, pages, next(self.sequence), key, load_jobs))
+
+    def prioritize(self, key):
+        # Moves a document that is still waiting, or already open, to the front
+        with self.lock:
+            if key not in self.pages_left or key in self.urgent:
+                return
+            self.urgent.add(key)
+            for i, entry in enumerate(self.waiting):
+                if entry[3] == key:
+                    self.waiting[i] = (False,) + entry[1:]
+                    heapq.heapify(self.waiting)
+                    break
+
+    def _admit(self):
+        opened = []
+        while self.waiting and (len(self.active) + len(opened) < self.max_active or self.waiting[0][3] in self.urgent):
+            _, _, _, key, load_jobs = heapq.heappop(self.waiting)
+            opened.append((key, load_jobs))
+        return opened
+
+    def _next(self):
+        with self.lock:
+            opened = self._admit()
+        for key, load_jobs in opened:
+            # Opening a document may read the whole PDF, so it runs outside the lock
+            jobs = deque(load_jobs())
+            with self.lock:
+                self.pages_left[key] = sum(len(page_numbers) for _, page_numbers in jobs)
+                if jobs:
+                    self.active.append((key, jobs))
+                else:
+                    self.empty.append(key)
+
+        with self.lock:
+            if self.empty:
+                return self.empty.popleft(), None
+            if not self.active:
+                return None
+            turn = next((i for i, (key, _) in enumerate(self.active) if key in self.urgent), 0)
+            self.active.rotate(-turn)
+            key, jobs = self.active.popleft()
+            job = jobs.popleft()
+            if jobs:
+                self.active.append((key, jobs))
+            return key, job
+
+    def __iter__(self):
+        # Yields (key, job) until every document is handed out; a document
+        # without any job left is yielded once as (key, None)
+        self.started = time.perf_counter()
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            yield item
+
+    def cancel(self, key):
+        # Drops the jobs a failed document still has in the queue
+        with self.lock:
+            self.active = deque(entry for entry in self.active if entry[0] != key)
+
+    def page_done(self, key):
+        with self.lock:
+            self.pages_done += 1
+            self.pages_left[key] = max(0, self.pages_left.get(key, 0) - 1)
+
+    def document_done(self, key):
+        with self.lock:
+            self.pages_left.pop(key, None)
+            self.urgent.discard(key)
+
+    def progress(self):
+        # Queue depth and an ETA from the page throughput of the run so far
+        with self.lock:
+            pages_queued = sum(self.pages_left.values())
+            documents = len(self.pages_left)
+            pages_done = self.pages_done
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        rate = pages_done / elapsed if elapsed else 0.0
+        return {
+            "documents": documents,
+            "pages_queued": pages_queued,
+            "pages_done": pages_done,
+            "pages_per_second": rate,
+            "eta_seconds": pages_queued / rate if rate else None
+        }
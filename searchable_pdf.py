@@ -0,0 +1,53 @@
+import os
+import fitz  # PyMuPDF
+
+# Sidecar searchable PDF: a copy of the source PDF with the OCR words written
+# invisibly (render mode 3) over the page images, at the boxes Tesseract found.
+# Search, highlighting and copy/paste then work on the native text layer; the
+# original (signed) PDF is never modified.
+
+SIDECAR_SUFFIX = '.ocr.pdf'
+SIDECAR_FONT = 'helv'
+
+def sidecar_path(pdf_path):
+    return os.path.splitext(pdf_path)[0] + SIDECAR_SUFFIX
+
+def is_sidecar(pdf_path):
+    return pdf_path.lower().endswith(SIDECAR_SUFFIX)
+
+def preferred_pdf_path(pdf_path):
+    # The viewers open the searchable copy when ingestion wrote one
+    sidecar = sidecar_path(pdf_path)
+    return sidecar if os.path.exists(sidecar) else pdf_path
+
+def insert_invisible_word(page, text, box):
+    x0, y0, x1, y1 = box
+    height = y1 - y0
+    width = fitz.get_text_length(text, fontname=SIDECAR_FONT, fontsize=height)
+    if height <= 0 or width <= 0:
+        return
+    # Baseline near the bottom of the box; the text is stretched to the box
+    # width so search hits line up with the word in the image
+    origin = fitz.Point(x0, y1 - height * 0.2)
+    page.insert_text(origin, text, fontname=SIDECAR_FONT, fontsize=height, render_mode=3,
+                     morph=(origin, fitz.Matrix((x1 - x0) / width, 1)))
+
+def write_searchable_pdf(pdf_path, pages, out_path):
+    # pages: page_data dicts of the document; only OCR pages get a text layer,
+    # born-digital pages already have one. Without OCR words there is nothing to
+    # add: no copy is written (a stale one is removed) and None is returned.
+    ocr_pages = [page_data for page_data in pages if page_data.get("source") == "ocr" and page_data.get("words")]
+    if not ocr_pages:
+        if os.path.exists(out_path):
+            os.remove(out_path)
+        return None
+    with fitz.open(pdf_path) as doc:
+        for page_data in ocr_pages:
+            page = doc[page_data["page_number"] - 1]
+            # Word boxes are stored in unrotated page space, where insert_text draws
+            for text, *box in page_data["words"]:
+                insert_invisible_word(page, text, fitz.Rect(box))
+        tmp_path = out_path + '.tmp'
+        doc.save(tmp_path, garbage=3, deflate=True)
+    os.replace(tmp_path, out_path)
+    return out_path
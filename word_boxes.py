@@ -0,0 +1,89 @@
+import os
+import re
+import json
+import math
+import fitz  # PyMuPDF
+from corpus_store import CorpusStore, corpus_path
+from compressed_io import open_text, find_output
+
+# Word boxes stored with every page, so the viewers can highlight a search term
+# without searching the PDF. A page's words are a list of
+#   [text, x0, y0, x1, y1]
+# in unrotated page space, in PDF points (origin at the top left, like PyMuPDF),
+# in reading order.
+
+BOX_DECIMALS = 1
+
+def pack_ocr_words(words, dpi):
+    # Tesseract boxes are in pixels of the page image rendered at `dpi`
+    scale = 72.0 / dpi
+    return [[word["text"]] + [round(v * scale, BOX_DECIMALS) for v in word["box"]] for word in words]
+
+def page_derotations(pdf_path):
+    # {page_number: derotation matrix} of the pages with a /Rotate; their images
+    # come out of the rasterizers already turned
+    with fitz.open(pdf_path) as doc:
+        return {i + 1: tuple(page.derotation_matrix) for i, page in enumerate(doc) if page.rotation}
+
+def page_space_words(words, image_size, deskew_angle=0.0, derotation=None):
+    # OCR boxes are measured on the page image, which is turned by the page's
+    # /Rotate and straightened by deskew. Map them to unrotated page space, where
+    # text-layer words and PyMuPDF annotations live: rotate each corner back about
+    # the image centre, then apply the page's derotation matrix. image_size is
+    # the image width and height in points.
+    if not deskew_angle and derotation is None:
+        return words
+    cx, cy = image_size[0] / 2, image_size[1] / 2
+    cos, sin = math.cos(math.radians(deskew_angle)), math.sin(math.radians(deskew_angle))
+    mapped = []
+    for text, x0, y0, x1, y1 in words:
+        xs, ys = [], []
+        for x, y in ((x0, y0), (x1, y0), (x0, y1), (x1, y1)):
+            dx, dy = x - cx, y - cy
+            x, y = cx + dx * cos - dy * sin, cy + dx * sin + dy * cos
+            if derotation is not None:
+                a, b, c, d, e, f = derotation
+                x, y = a * x + c * y + e, b * x + d * y + f
+            xs.append(x)
+            ys.append(y)
+        mapped.append([text] + [round(v, BOX_DECIMALS) for v in (min(xs), min(ys), max(xs), max(ys))])
+    return mapped
+
+def pack_text_layer_words(page):
+    # Words of a born-digital page straight from PyMuPDF, already in points
+    return [[text, round(x0, BOX_DECIMALS), round(y0, BOX_DECIMALS), round(x1, BOX_DECIMALS), round(y1, BOX_DECIMALS)]
+            for x0, y0, x1, y1, text, *_ in page.get_text("words")]
+
+def normalize_word(word):
+    return re.sub(r'\W+', '', word.lower())
+
+def find_word_boxes(words, term):
+    # Boxes of every occurrence of `term`: each word of the term has to appear,
+    # case-insensitively, inside consecutive words of the page
+    tokens = [normalize_word(t) for t in term.split()]
+    tokens = [t for t in tokens if t]
+    if not words or not tokens:
+        return []
+    page_words = [normalize_word(word[0]) for word in words]
+    boxes = []
+    for i in range(len(page_words) - len(tokens) + 1):
+        if all(token in page_words[i + k] for k, token in enumerate(tokens)):
+            boxes.extend(tuple(words[i + k][1:5]) for k in range(len(tokens)))
+    return boxes
+
+def load_page_words(pdf_path):
+    # {page_number: words} from the corpus database, or else from the JSON
+    # written next to the PDF; pages stored before word boxes existed are left out
+    directory, filename = os.path.split(pdf_path)
+    data = None
+    if os.path.exists(corpus_path(directory)):
+        store = CorpusStore(corpus_path(directory))
+        data = store.load_document(filename)
+        store.close()
+    if data is None:
+        json_path = find_output(os.path.splitext(pdf_path)[0] + '.json')
+        if json_path is None:
+            return {}
+        with open_text(json_path) as f:
+            data = json.load(f)
+    return {page["page_number"]: page["words"] for page in data.get("pages", []) if "words" in page}